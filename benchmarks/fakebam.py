@@ -0,0 +1,445 @@
+'''Stateful fake of the BlueCat Address Manager REST v1 API.
+
+It implements the endpoints used by proteuscmd closely enough to run the
+command line client against it, counts requests per endpoint and can add
+latency and inject errors. It is meant for benchmarks, not as a reference
+of the API.
+
+Run it standalone with:
+
+    python benchmarks/fakebam.py --port 8099 --latency 0.005
+'''
+import argparse
+import ipaddress
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EMPTY = {'id': 0, 'name': None, 'type': None, 'properties': None}
+
+ENDPOINTS = ('login', 'logout', 'getEntityById', 'getEntitiesByName',
+             'getEntities', 'getZonesByHint', 'getIPRangedByIP',
+             'getIP4Address', 'getIP6Address', 'getLinkedEntities',
+             'getMACAddress', 'customSearch', 'assignIP4Address',
+             'addIP6Address', 'assignIP6Address', 'addHostRecord',
+             'addAliasRecord', 'update', 'delete')
+
+
+class NotFound(Exception):
+    pass
+
+
+def _mac(mac):
+    return mac.lower().replace('-', ':')
+
+
+def _properties(text):
+    # values keep escaped separators like a\|b as they are sent back as is
+    props = re.split(r'(?<!\\)\|', text or '')
+    pairs = (prop.split('=', 1) for prop in props if prop)
+    return {pair[0]: pair[1] if len(pair) > 1 else '' for pair in pairs}
+
+
+class FakeBAM:
+    '''In-memory entity tree with a configuration `default`, the views
+    `intern` and `extern` and some zones and networks:
+
+    - example.com with `records` host records (in both views)
+    - 192.0.2.0/24 and 198.51.100.0/24 in the block 192.0.0.0/8
+    - 10.0.0.0/22 in the block 10.0.0.0/8 with `addresses` assigned
+    - 2001:db8::/64 in the block 2001:db8::/32
+    '''
+
+    def __init__(self, latency=0, error_rate=0, errors=None, records=100,
+                 addresses=500, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = dict(errors or {})
+        self.calls = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.__random = random.Random(seed)
+        self.__ids = itertools.count(1000)
+        self.__entities = {}
+        self.__tokens = set()
+        self.__populate(records, addresses)
+
+    def __add(self, name, object_type, parent, **properties):
+        entity_id = next(self.__ids)
+        self.__entities[entity_id] = {'id': entity_id,
+                                      'name': name,
+                                      'type': object_type,
+                                      'properties': properties,
+                                      'parent': parent}
+        return entity_id
+
+    def __populate(self, records, addresses):
+        conf = self.__add('default', 'Configuration', 0)
+        for view_name in ('intern', 'extern'):
+            view = self.__add(view_name, 'View', conf)
+            com = self.__add('com', 'Zone', view, absoluteName='com')
+            example = self.__add('example', 'Zone', com,
+                                 absoluteName='example.com')
+            for i in range(records):
+                self.__add(f'host{i}', 'HostRecord', example,
+                           absoluteName=f'host{i}.example.com',
+                           addresses=f'192.0.2.{i % 250 + 1}')
+        block = self.__add('192.0.0.0/8', 'IP4Block', conf,
+                           CIDR='192.0.0.0/8')
+        self.__add('192.0.2.0/24', 'IP4Network', block, CIDR='192.0.2.0/24')
+        self.__add('198.51.100.0/24', 'IP4Network', block,
+                   CIDR='198.51.100.0/24')
+        block = self.__add('10.0.0.0/8', 'IP4Block', conf, CIDR='10.0.0.0/8')
+        network = self.__add('10.0.0.0/22', 'IP4Network', block,
+                             CIDR='10.0.0.0/22')
+        hosts = ipaddress.ip_network('10.0.0.0/22').hosts()
+        for i, address in zip(range(addresses), hosts):
+            self.__add(None, 'IP4Address', network, address=str(address),
+                       state='DHCP_RESERVED',
+                       macAddress=f'02:00:00:00:{i >> 8:02x}:{i & 255:02x}',
+                       admin_email=f'admin{i % 10}@example.com')
+        block = self.__add('2001:db8::/32', 'IP6Block', conf,
+                           prefix='2001:db8::/32')
+        self.__add('2001:db8::/64', 'IP6Network', block,
+                   prefix='2001:db8::/64')
+
+    # helpers
+
+    def __public(self, entity):
+        if not entity:
+            return dict(EMPTY)
+        properties = ''.join(f'{k}={v}|'
+                             for k, v in entity['properties'].items())
+        return {'id': entity['id'],
+                'name': entity['name'],
+                'type': entity['type'],
+                'properties': properties}
+
+    def __children(self, parent, object_type):
+        return [e for e in self.__entities.values()
+                if e['parent'] == parent and e['type'] == object_type]
+
+    def __entity(self, entity_id):
+        entity = self.__entities.get(int(entity_id))
+        if not entity:
+            raise NotFound(f'Object with id {entity_id} was not found')
+        return entity
+
+    def __page(self, entities, q):
+        start, count = int(q.get('start', 0)), int(q.get('count', 10))
+        return [self.__public(e) for e in entities[start:start + count]]
+
+    def __network(self, entity):
+        cidr = entity['properties'].get('CIDR') \
+            or entity['properties'].get('prefix')
+        return ipaddress.ip_network(cidr)
+
+    def __find_range(self, address, object_type):
+        address = ipaddress.ip_address(address)
+        found = [e for e in self.__entities.values()
+                 if e['type'] == object_type
+                 and address in self.__network(e)]
+        return max(found, key=lambda e: self.__network(e).prefixlen,
+                   default=None)
+
+    def __find_address(self, address):
+        address = ipaddress.ip_address(address).compressed
+        version = ipaddress.ip_address(address).version
+        for entity in self.__entities.values():
+            if entity['type'] == f'IP{version}Address' \
+                    and entity['properties'].get('address') == address:
+                return entity
+        return None
+
+    def __view_zone(self, view, absolute_name):
+        '''Get the zone and the host name of an absolute name in a view.
+        '''
+        labels = absolute_name.lower().rstrip('.').split('.')
+        parent = view
+        for label in labels[:0:-1]:
+            zones = [z for z in self.__children(parent, 'Zone')
+                     if z['name'] == label]
+            if not zones:
+                raise NotFound(f'Zone for {absolute_name} was not found')
+            parent = zones[0]['id']
+        return parent, labels[0]
+
+    def __add_hosts(self, address, host_info):
+        '''Create host records from IPv4 (name,view,...) or IPv6
+        (view,name,...) host information.
+        '''
+        fields = host_info.split(',')
+        for i in range(0, len(fields), 4):
+            name, view = fields[i], fields[i + 1]
+            if name.isdigit():
+                name, view = view, name
+            zone, host = self.__view_zone(int(view), name)
+            self.__add(host, 'HostRecord', zone, absoluteName=name,
+                       addresses=address)
+
+    # endpoints
+
+    def login(self, q):
+        token = f'BAMAuthToken: {self.__random.getrandbits(64):x}'
+        self.__tokens.add(token)
+        return f'Session Token-> {token} <- for User : {q["username"]}'
+
+    def logout(self, q, token):
+        self.__tokens.discard(token)
+        return 'Successfully logged out'
+
+    def getEntityById(self, q):
+        return self.__public(self.__entities.get(int(q['id'])))
+
+    def getEntitiesByName(self, q):
+        entities = [e for e in self.__children(int(q['parentId']), q['type'])
+                    if e['name'] == q['name']]
+        return self.__page(entities, q)
+
+    def getEntities(self, q):
+        return self.__page(self.__children(int(q['parentId']), q['type']), q)
+
+    def getZonesByHint(self, q):
+        hint = _properties(q.get('options')).get('hint', '')
+        zones = []
+        for entity in self.__entities.values():
+            if entity['type'] != 'Zone':
+                continue
+            parent = entity
+            while parent['type'] == 'Zone':
+                parent = self.__entities[parent['parent']]
+            if parent['id'] == int(q['containerId']) \
+                    and entity['properties']['absoluteName'].startswith(hint):
+                zones.append(entity)
+        return self.__page(zones, q)
+
+    def getIPRangedByIP(self, q):
+        return self.__public(self.__find_range(q['address'], q['type']))
+
+    def getIP4Address(self, q):
+        return self.__public(self.__find_address(q['address']))
+
+    def getIP6Address(self, q):
+        return self.__public(self.__find_address(q['address']))
+
+    def getLinkedEntities(self, q):
+        entity = self.__entity(q['entityId'])
+        if entity['type'] == 'MACAddress':
+            mac = entity['name']
+            linked = [e for e in self.__entities.values()
+                      if e['type'] == q['type']
+                      and _mac(e['properties'].get('macAddress', '')) == mac]
+        else:
+            address = entity['properties'].get('address')
+            linked = [e for e in self.__entities.values()
+                      if e['type'] == q['type'] and address in
+                      e['properties'].get('addresses', '').split(',')]
+        return self.__page(linked, q)
+
+    def getMACAddress(self, q):
+        mac = _mac(q['macAddress'])
+        for entity in self.__children(int(q['configurationId']),
+                                      'MACAddress'):
+            if entity['name'] == mac:
+                return self.__public(entity)
+        if any(_mac(e['properties'].get('macAddress', '')) == mac
+               for e in self.__entities.values()):
+            entity_id = self.__add(mac, 'MACAddress',
+                                   int(q['configurationId']))
+            return self.__public(self.__entities[entity_id])
+        return dict(EMPTY)
+
+    def customSearch(self, q, filters):
+        filters = _properties('|'.join(filters))
+        found = [e for e in self.__entities.values()
+                 if e['type'] == q['type']
+                 and all(e['properties'].get(k) == v
+                         for k, v in filters.items())]
+        return self.__page(found, q)
+
+    def assignIP4Address(self, q):
+        address = q['ip4Address']
+        if self.__find_address(address):
+            raise ValueError(f'Address {address} is already assigned')
+        network = self.__find_range(address, 'IP4Network')
+        if not network:
+            raise NotFound(f'No network found for {address}')
+        properties = _properties(q.get('properties'))
+        entity_id = self.__add(properties.pop('name', None), 'IP4Address',
+                               network['id'], address=address,
+                               state=q['action'].replace('MAKE_', ''),
+                               macAddress=q.get('macAddress', ''),
+                               **properties)
+        if q.get('hostInfo'):
+            self.__add_hosts(address, q['hostInfo'])
+        return entity_id
+
+    def addIP6Address(self, q):
+        address = ipaddress.ip_address(q['address']).compressed
+        if self.__find_address(address):
+            raise ValueError(f'Address {address} already exists')
+        return self.__add(q.get('name'), 'IP6Address', int(q['containerId']),
+                          address=address,
+                          **_properties(q.get('properties')))
+
+    def assignIP6Address(self, q):
+        entity = self.__find_address(q['address'])
+        if not entity:
+            raise NotFound(f'Address {q["address"]} was not found')
+        properties = _properties(q.get('properties'))
+        properties.pop('reserveUsing', None)
+        entity['properties'].update(properties,
+                                    state=q['action'].replace('MAKE_', ''),
+                                    macAddress=q.get('macAddress', ''))
+        if q.get('hostInfo'):
+            self.__add_hosts(entity['properties']['address'], q['hostInfo'])
+        return True
+
+    def addHostRecord(self, q):
+        zone, host = self.__view_zone(int(q['viewId']), q['absoluteName'])
+        return self.__add(host, 'HostRecord', zone,
+                          absoluteName=q['absoluteName'],
+                          addresses=q['addresses'])
+
+    def addAliasRecord(self, q):
+        zone, host = self.__view_zone(int(q['viewId']), q['absoluteName'])
+        return self.__add(host, 'AliasRecord', zone,
+                          absoluteName=q['absoluteName'],
+                          linkedRecordName=q['linkedRecordName'])
+
+    def update(self, q, entity):
+        current = self.__entity(entity['id'])
+        if entity.get('type') != current['type']:
+            raise ValueError('The type of an object cannot be changed')
+        current['name'] = entity.get('name')
+        current['properties'] = _properties(entity.get('properties'))
+
+    def delete(self, q):
+        entity = self.__entity(q['objectId'])
+        children = [e['id'] for e in self.__entities.values()
+                    if e['parent'] == entity['id']]
+        for child in children:
+            self.delete({'objectId': child})
+        del self.__entities[entity['id']]
+
+    # request handling
+
+    def handle(self, endpoint, query, token, data=None):
+        '''Handle a request and return status code and result.
+        data is the decoded JSON body of the request if it has one.
+        '''
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if endpoint in self.errors:
+            return self.errors[endpoint], f'Injected error for {endpoint}'
+        if self.error_rate and self.__random.random() < self.error_rate:
+            return 503, 'Injected random error'
+
+        if endpoint not in ENDPOINTS:
+            return 404, f'Unknown endpoint {endpoint}'
+        q = {k: v[0] for k, v in query.items()}
+        handler = getattr(self, endpoint)
+        with self.lock:
+            try:
+                if endpoint == 'login':
+                    return 200, handler(q)
+                if token not in self.__tokens:
+                    return 401, 'Authentication required'
+                if endpoint == 'logout':
+                    return 200, handler(q, token)
+                if endpoint == 'customSearch':
+                    return 200, handler(q, query.get('filters', []))
+                if endpoint == 'update':
+                    return 200, handler(q, data or {})
+                return 200, handler(q)
+            except NotFound as e:
+                return 500, str(e)
+            except (KeyError, ValueError) as e:
+                return 500, f'{type(e).__name__}: {e}'
+
+    def stats(self):
+        with self.lock:
+            return {'calls': dict(self.calls),
+                    'requests': sum(self.calls.values()),
+                    'connections': self.connections}
+
+    def serve(self, host='127.0.0.1', port=0):
+        '''Create an HTTP server for this fake. Port 0 picks a free port.
+        '''
+        bam = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with bam.lock:
+                    bam.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def respond(self):
+                url = urlparse(self.path)
+                endpoint = url.path.rsplit('/', 1)[-1]
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.loads(self.rfile.read(length)) if length else None
+                if endpoint == 'stats':
+                    status, result = 200, bam.stats()
+                else:
+                    query = parse_qs(url.query, keep_blank_values=True)
+                    token = self.headers.get('Authorization')
+                    status, result = bam.handle(endpoint, query, token, data)
+                body = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = respond
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+    def start(self):
+        '''Serve in a background thread and return the base URL.
+        '''
+        server = self.serve()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds to delay each request')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Fraction of requests failing with 503')
+    parser.add_argument('--error', action='append', default=[],
+                        metavar='ENDPOINT=STATUS',
+                        help='Let all requests to an endpoint fail')
+    args = parser.parse_args()
+    errors = {endpoint: int(status) for endpoint, status in
+              (error.split('=', 1) for error in args.error)}
+    bam = FakeBAM(args.latency, args.error_rate, errors)
+    server = bam.serve(port=args.port)
+    print(f'Serving on http://127.0.0.1:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
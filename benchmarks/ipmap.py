@@ -0,0 +1,114 @@
+'''Microbenchmark of mapping addresses between IPv4 and IPv6.
+
+Compares scanning the v4_v6_map configuration for every address, like it
+was done before, with the compiled IPMap for addresses as objects, like
+`ip map ADDRESS`, and as text, like `ip map --file`:
+
+    python benchmarks/ipmap.py
+    python benchmarks/ipmap.py --count 100000 --networks 500
+
+The linear scan is slow, so it is only run for a sample of the addresses
+and extrapolated.
+'''
+import argparse
+import ipaddress
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from proteuscmd.ipmap import IPMap  # noqa: E402
+
+
+def _mappings(networks):
+    return [{'cidr': f'10.{i >> 6 & 255}.{(i & 63) << 2}.0/22',
+             'prefix': f'2001:db8:{i:x}::/64'} for i in range(networks)]
+
+
+def _linear(mappings, ip):
+    '''Mapping as it was done before IPMap.
+    '''
+    for ip_map in mappings:
+        ipv4_network = ipaddress.IPv4Network(ip_map['cidr'])
+        ipv6_network = ipaddress.IPv6Network(ip_map['prefix'])
+        if ip.version == 4 and ip in ipv4_network:
+            int_network_address = int(ipv6_network.network_address)
+            return ipaddress.IPv6Address(int_network_address | int(ip))
+        if ip.version == 6 and ip in ipv6_network:
+            return ipaddress.IPv4Address(int(ip) & 0xFFFFFFFF)
+    raise ValueError(f'No mapping found for IP {ip.compressed}')
+
+
+def _addresses(count, ip_map, networks):
+    '''IPv4 and IPv6 addresses alternately, spread over all networks.
+    '''
+    addresses = []
+    for i in range(count):
+        network, host = i % networks, i // networks % 1022 + 1
+        address = f'10.{network >> 6 & 255}.' \
+                  f'{(network & 63) << 2 | host >> 8}.{host & 255}'
+        addresses.append(ip_map.map_text(address) if i % 2 else address)
+    return addresses
+
+
+def _seconds(addresses, fn):
+    start = time.perf_counter()
+    for address in addresses:
+        fn(address)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description=__doc__.split('\n')[0],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000,
+                        help='Number of addresses (default 1000000)')
+    parser.add_argument('--networks', type=int, default=100,
+                        help='Number of mapped networks (default 100)')
+    parser.add_argument('--sample', type=int, default=10000,
+                        help='Addresses to run the linear scan for '
+                        '(default 10000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per scenario to take the fastest of')
+    args = parser.parse_args()
+
+    mappings = _mappings(args.networks)
+    ip_map = IPMap(mappings)
+    addresses = _addresses(args.count, ip_map, args.networks)
+    sample = addresses[:min(args.sample, args.count)]
+
+    # name, function, addresses to measure
+    scenarios = (
+        ('linear scan', lambda text: _linear(
+            mappings, ipaddress.ip_address(text)).compressed, sample),
+        ('IPMap.map', lambda text: ip_map.map(
+            ipaddress.ip_address(text)).compressed, addresses),
+        ('IPMap.map_text', ip_map.map_text, addresses),
+    )
+
+    # scenarios are interleaved to spread out noise of other processes
+    seconds = {name: [] for name, _, _ in scenarios}
+    baseline = []
+    for _ in range(args.repeat):
+        # time to iterate over the addresses is not counted
+        baseline.append(_seconds(addresses, str) / len(addresses))
+        for name, fn, measured in scenarios:
+            seconds[name].append(_seconds(measured, fn) / len(measured))
+
+    per_address = {name: max(min(times) - min(baseline), 1e-9)
+                   for name, times in seconds.items()}
+    print(f'{"scenario":<18}{"seconds":>10}{"us/address":>12}{"speedup":>9}')
+    for name, _, measured in scenarios:
+        total = per_address[name] * args.count
+        mark = '*' if len(measured) < args.count else ' '
+        speedup = per_address['linear scan'] / per_address[name]
+        print(f'{name:<18}{total:>9.2f}{mark}'
+              f'{per_address[name] * 1e6:>12.2f}{speedup:>8.0f}x')
+    if len(sample) < args.count:
+        print(f'* extrapolated from {len(sample)} addresses')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''Microbenchmark of decoding entity properties.
+
+Compares decoding all properties of every entity into dictionaries, like
+it was done before, with records decoding them on demand:
+
+    python benchmarks/properties.py
+    python benchmarks/properties.py --count 100000
+'''
+import argparse
+import pathlib
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from proteuscmd.records import Record, parse_properties  # noqa: E402
+
+
+def _eager(properties):
+    '''Decoding as it was done before records.
+    '''
+    properties = properties.split('|')
+    properties = [prop.split('=', 1) for prop in properties if prop]
+    return {prop[0]: prop[1] for prop in properties}
+
+
+def _entities(count):
+    for i in range(count):
+        yield {'id': i,
+               'name': f'host{i}',
+               'type': 'IP4Address',
+               'properties': f'address=10.{i >> 16 & 255}.{i >> 8 & 255}.'
+                             f'{i & 255}|state=DHCP_RESERVED|'
+                             f'macAddress=02-00-00-{i >> 16 & 255:02X}-'
+                             f'{i >> 8 & 255:02X}-{i & 255:02X}|'
+                             f'admin_email=admin@example.com|'
+                             f'admin_name=Admin|admin_phone=0|'
+                             f'comment=rack {i % 40}|'}
+
+
+def _decode_all(entity):
+    entity['properties'] = _eager(entity['properties'])
+    return entity
+
+
+SCENARIOS = (
+    ('dict, decode all', _decode_all, lambda e: e['properties']['address']),
+    ('parse_properties', lambda e: parse_properties(e['properties']),
+     lambda p: p['address']),
+    ('record, one property', Record.from_entity, lambda r: r.address),
+    ('record, all properties', Record.from_entity,
+     lambda r: r.properties['address']),
+)
+
+
+def _seconds(count, create, access):
+    start = time.perf_counter()
+    for entity in _entities(count):
+        access(create(entity))
+    return time.perf_counter() - start
+
+
+def _size(count, create, access):
+    '''Memory per entity when keeping them, e.g. the records of a zone.
+    '''
+    tracemalloc.start()
+    items = [create(entity) for entity in _entities(count)]
+    for item in items:
+        access(item)
+    size = tracemalloc.get_traced_memory()[0] / count
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description=__doc__.split('\n')[0],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000,
+                        help='Number of property strings (default 1000000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per scenario to take the fastest of')
+    args = parser.parse_args()
+
+    # scenarios are interleaved to spread out noise of other processes
+    seconds = {name: [] for name, _, _ in SCENARIOS}
+    baseline = []
+    for _ in range(args.repeat):
+        # time to generate the entities is not counted
+        baseline.append(_seconds(args.count, dict, id))
+        for name, create, access in SCENARIOS:
+            seconds[name].append(_seconds(args.count, create, access))
+
+    print(f'{"scenario":<24}{"seconds":>9}{"bytes/entity":>14}')
+    for name, create, access in SCENARIOS:
+        size = _size(min(args.count, 100000), create, access)
+        print(f'{name:<24}{min(seconds[name]) - min(baseline):>9.2f}'
+              f'{size:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+'''End-to-end benchmarks of proteuscmd against the fake BAM server.
+
+Every scenario runs the command line client in a subprocess, like a user
+would, and reports the number of requests, the number of connections opened
+and the wall time. Requests are counted with a cold entity cache and with a
+warm one. The counts are deterministic and compared with the thresholds in
+thresholds.json to catch regressions in the call patterns.
+
+The startup time of offline commands is measured as well, since it adds to
+every invocation. The time beyond starting Python and importing click is
+compared relative to the time of the latter, to be independent of the speed
+of the machine. Modules which should be imported lazily are reported:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --latency 0.02 --repeat 5
+    python benchmarks/run.py --update  # accept the current counts
+'''
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess  # nosec blacklist
+import sys
+import tempfile
+import time
+
+from fakebam import FakeBAM
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+THRESHOLDS = pathlib.Path(__file__).resolve().parent / 'thresholds.json'
+
+ADMIN = ['-e', 'admin@example.com', '-n', 'Admin', '-p', '0']
+
+
+def _batch_set(count):
+    return [{'command': 'ip set', 'ip': f'198.51.100.{i}', 'force': True,
+             'mac': f'02:00:00:01:00:{i:02x}'} for i in range(1, count + 1)]
+
+
+def _batch_delete(count):
+    return [{'command': 'ip delete', 'ip': f'198.51.100.{i}'}
+            for i in range(1, count + 1)]
+
+
+def _provision(count):
+    return [{'ip': f'192.0.2.{i}', 'mac': f'02:00:00:02:00:{i:02x}',
+             'hostname': f'rack{i}.example.com'}
+            for i in range(101, 101 + count)]
+
+
+def _provision_delete(count):
+    return [{'command': command, 'ip': f'192.0.2.{i}', 'version': 'both',
+             'domain': f'rack{i}.example.com'}
+            for i in range(101, 101 + count)
+            for command in ('ip delete', 'dns delete')]
+
+
+def _desired(count, present=True):
+    return {'records': {f'sync{i}.example.com':
+                        f'192.0.2.{i}' if present else None
+                        for i in range(1, count + 1)}}
+
+
+# name, command, setup commands run before without being measured
+SCENARIOS = (
+    ('dns get', ['dns', 'get', 'host1.example.com'], []),
+    ('dns set', ['dns', 'set', 'new.example.com', '192.0.2.99'],
+     [['dns', 'delete', '--force', 'new.example.com']]),
+    ('dns delete', ['dns', 'delete', '--force', 'old.example.com'],
+     [['dns', 'set', 'old.example.com', '192.0.2.98']]),
+    ('dns list', ['dns', 'list', 'example.com'], []),
+    ('ip get', ['ip', 'get', '10.0.0.5'], []),
+    ('ip get both', ['ip', 'get', '--version', 'both', '192.0.2.7'], []),
+    ('ip set', ['ip', 'set', *ADMIN, '192.0.2.50', '02:00:00:00:10:50'],
+     [['ip', 'delete', '--force', '192.0.2.50']]),
+    ('ip set both', ['ip', 'set', *ADMIN, '--version', 'both', '192.0.2.51',
+                     '02:00:00:00:10:51'],
+     [['ip', 'delete', '--force', '--version', 'both', '192.0.2.51']]),
+    ('ip delete', ['ip', 'delete', '--force', '192.0.2.52'],
+     [['ip', 'set', *ADMIN, '--force', '192.0.2.52', '02:00:00:00:10:52']]),
+    ('ip list', ['ip', 'list', '10.0.0.0/22'], []),
+    ('ip export', ['ip', 'export', '10.0.0.0/8'], []),
+    ('ip find', ['ip', 'find', '--mac', '02:00:00:00:00:07'], []),
+    ('batch 50 ip set', ['batch', '{batch_set}'],
+     [['batch', '--continue-on-error', '{batch_delete}']]),
+    ('batch 50 ip set -j8', ['batch', '-j', '8', '{batch_set}'],
+     [['batch', '--continue-on-error', '{batch_delete}']]),
+    ('provision 50 both -j8', ['ip', 'provision', '--version', 'both', '-j',
+                               '8', '{provision}'],
+     [['batch', '--continue-on-error', '{provision_delete}']]),
+    ('dns sync 50', ['dns', 'sync', '{sync_present}'],
+     [['dns', 'sync', '{sync_absent}']]),
+    ('dns get zone walk', ['dns', 'get', 'host1.example.com'], []),
+)
+
+# errors injected into the fake while running a scenario
+ERRORS = {
+    # zones are found label by label if the search is not supported
+    'dns get zone walk': {'getZonesByHint': 404},
+}
+
+# offline commands whose startup is measured, including the check for a
+# running daemon every invocation does, and the lazy modules they need
+STARTUP_COMMANDS = ((['--help'], ()),
+                    (['ip', 'map', '192.0.2.1'], ('socket',)))
+
+# modules only imported by the commands needing them, see __main__
+LAZY_MODULES = ('requests', 'sqlite3', 'csv', 'socket', 'concurrent.futures')
+
+# the fastest of several runs is compared since timings are noisy
+STARTUP_RUNS = 7
+
+
+class Runner:
+
+    def __init__(self, bam, url, workdir):
+        self.__bam = bam
+        self.__workdir = workdir
+        self.__files = {}
+        home = workdir / 'home'
+        home.mkdir()
+        config = {'url': url,
+                  'user': 'admin',
+                  'password_cmd': 'echo secret',
+                  'admin_email': 'admin@example.com',
+                  'admin_name': 'Admin',
+                  'admin_phone': '0',
+                  'v4_v6_map': [{'cidr': '192.0.2.0/24',
+                                 'prefix': '2001:db8::/64'}]}
+        (home / '.proteus.json').write_text(json.dumps(config))
+        self.__env = {**os.environ,
+                      'HOME': str(home),
+                      'XDG_CACHE_HOME': str(workdir / 'cache'),
+                      'PROTEUSCMD_NO_DAEMON': '1',
+                      'PYTHONPATH': str(ROOT)}
+        self.__write('batch_set', '\n'.join(map(json.dumps, _batch_set(50))))
+        self.__write('batch_delete',
+                     '\n'.join(map(json.dumps, _batch_delete(50))))
+        self.__write('provision',
+                     '\n'.join(map(json.dumps, _provision(50))))
+        self.__write('provision_delete',
+                     '\n'.join(map(json.dumps, _provision_delete(50))))
+        self.__write('sync_present', json.dumps(_desired(50)), '.json')
+        self.__write('sync_absent', json.dumps(_desired(50, False)), '.json')
+
+    def __write(self, name, content, suffix='.jsonl'):
+        path = self.__workdir / f'{name}{suffix}'
+        path.write_text(content + '\n')
+        self.__files[name] = str(path)
+
+    def __run(self, args):
+        args = [arg.format(**self.__files) for arg in args]
+        start = time.perf_counter()
+        result = subprocess.run(  # nosec B603
+                [sys.executable, '-m', 'proteuscmd', *args],
+                env=self.__env, cwd=self.__workdir, capture_output=True,
+                text=True)
+        return result, time.perf_counter() - start
+
+    def __fastest(self, args, env):
+        times = []
+        for _ in range(STARTUP_RUNS):
+            start = time.perf_counter()
+            subprocess.run(  # nosec B603
+                    [sys.executable, *args], env=env, cwd=self.__workdir,
+                    capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def measure_startup(self):
+        '''Run offline commands like a user would, without disabling the
+        daemon. Returns the time of the slowest one beyond starting Python
+        and importing click in milliseconds, the same time relative to
+        starting Python and importing click and the lazy modules imported
+        anyway.
+        '''
+        env = {k: v for k, v in self.__env.items()
+               if k != 'PROTEUSCMD_NO_DAEMON'}
+        click = self.__fastest(['-c', 'import click'], env)
+        slowest, eager = 0, set()
+        for command, needed in STARTUP_COMMANDS:
+            args = ['-m', 'proteuscmd', *command]
+            slowest = max(slowest, self.__fastest(args, env) - click)
+            result = subprocess.run(  # nosec B603
+                    [sys.executable, '-X', 'importtime', *args], env=env,
+                    cwd=self.__workdir, capture_output=True, text=True,
+                    check=True)
+            # lines look like `import time: self | cumulative | module`
+            for line in result.stderr.splitlines():
+                if line.startswith('import time:'):
+                    module = line.split('|')[-1].strip()
+                    if module in LAZY_MODULES and module not in needed:
+                        eager.add(module)
+        return round(slowest * 1000, 1), round(slowest / click, 2), \
+            sorted(eager)
+
+    def clear_cache(self):
+        shutil.rmtree(self.__workdir / 'cache', ignore_errors=True)
+
+    def prepare(self, setup):
+        '''Run setup commands. They may fail if there is nothing to do.
+        '''
+        for args in setup:
+            self.__run(args)
+
+    def measure(self, command, may_fail=False):
+        '''Run a command and return the number of requests, the number of
+        connections opened, the wall time and if it failed.
+        '''
+        before = self.__bam.stats()
+        result, seconds = self.__run(command)
+        if result.returncode and not may_fail:
+            raise RuntimeError(f'{" ".join(command)} failed:\n'
+                               f'{result.stderr[-2000:]}')
+        after = self.__bam.stats()
+        calls = after['requests'] - before['requests']
+        connections = after['connections'] - before['connections']
+        return calls, connections, seconds, bool(result.returncode)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description=__doc__.split('\n')[0],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='Seconds to delay each request (default 0.005)')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Fraction of requests failing with 503. '
+                        'Thresholds are not checked if set.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Warm runs per scenario to take the median of')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='Allowed relative increase of requests over '
+                        'the thresholds. Parallel runs with a cold cache '
+                        'may vary slightly. (default 0.05)')
+    parser.add_argument('--filter', default='',
+                        help='Only run scenarios containing this text')
+    parser.add_argument('--json', action='store_true',
+                        help='Print results as JSON')
+    parser.add_argument('--update', action='store_true',
+                        help='Write the request counts as new thresholds')
+    args = parser.parse_args()
+
+    bam = FakeBAM(latency=args.latency, error_rate=args.error_rate)
+    url = bam.start()
+    thresholds = json.loads(THRESHOLDS.read_text()) \
+        if THRESHOLDS.exists() else {}
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        runner = Runner(bam, url, pathlib.Path(workdir))
+        for name, command, setup in SCENARIOS:
+            if args.filter not in name:
+                continue
+            # with injected errors, commands are expected to fail sometimes
+            may_fail = bool(args.error_rate)
+            bam.errors = ERRORS.get(name, {})
+            runner.prepare(setup)
+            runner.clear_cache()
+            cold = runner.measure(command, may_fail)
+            runs = []
+            for _ in range(args.repeat):
+                runner.prepare(setup)
+                runs.append(runner.measure(command, may_fail))
+            results[name] = {
+                    'cold': cold[0],
+                    'warm': max(calls for calls, _, _, _ in runs),
+                    'connections': max(c for _, c, _, _ in runs + [cold]),
+                    'cold_seconds': round(cold[2], 3),
+                    'seconds': round(statistics.median(
+                        seconds for _, _, seconds, _ in runs), 3),
+                    'failures': sum(failed for *_, failed in runs + [cold])}
+
+            limit = thresholds.get(name)
+            if limit and not args.update and not args.error_rate:
+                regressions = [k for k in ('cold', 'warm', 'connections')
+                               if k in limit and results[name][k]
+                               > limit[k] * (1 + args.tolerance)]
+                if regressions:
+                    results[name]['regression'] = regressions
+                    failed = True
+
+        startup = None
+        if args.filter in 'startup':
+            milliseconds, ratio, eager = runner.measure_startup()
+            startup = {'milliseconds': milliseconds, 'click_ratio': ratio,
+                       'eager': eager}
+            limit = thresholds.get('startup')
+            if eager or limit and ratio > limit['click_ratio']:
+                startup['regression'] = True
+                failed = True
+
+    if args.update:
+        thresholds.update({name: {'cold': r['cold'], 'warm': r['warm'],
+                                  'connections': r['connections']}
+                           for name, r in results.items()})
+        THRESHOLDS.write_text(json.dumps(thresholds, indent=2) + '\n')
+
+    if args.json:
+        print(json.dumps({**results, 'startup': startup} if startup
+                         else results, indent=2))
+    else:
+        print(f'{"scenario":<22}{"cold":>6}{"warm":>6}{"conns":>6}'
+              f'{"cold s":>9}{"warm s":>9}  limit')
+        for name, r in results.items():
+            limit = thresholds.get(name, {})
+            limit = '/'.join(str(limit.get(k, '-'))
+                             for k in ('cold', 'warm', 'connections'))
+            flag = '  REGRESSION' if r.get('regression') else ''
+            if r['failures']:
+                flag += f'  {r["failures"]} failed'
+            print(f'{name:<22}{r["cold"]:>6}{r["warm"]:>6}'
+                  f'{r["connections"]:>6}'
+                  f'{r["cold_seconds"]:>9.3f}{r["seconds"]:>9.3f}  '
+                  f'{limit}{flag}')
+        if startup:
+            limit = thresholds.get('startup', {}).get('click_ratio', '-')
+            flag = '  REGRESSION' if startup.get('regression') else ''
+            if startup['eager']:
+                flag += f'  imports {", ".join(startup["eager"])}'
+            print(f'{"startup":<22}{startup["milliseconds"]:>18.1f} ms'
+                  f'{startup["click_ratio"]:>6.2f} x click  '
+                  f'{limit} x click{flag}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
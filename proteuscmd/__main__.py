@@ -1,57 +1,298 @@
+from __future__ import annotations
+
 import click
+import contextvars
+import io
 import ipaddress
 import json
-import requests
+import sys
+import threading
 
-from functools import wraps
+from click.core import ParameterSource
+from functools import cache, partial, wraps
+from operator import itemgetter
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
 from proteuscmd import version
-from proteuscmd.api import Proteus
-from proteuscmd.config import proteus_from_config, config
+from proteuscmd.cache import cache_dir, clear_cache, write_private
+from proteuscmd.config import (
+    active_profile, config, proteus_from_config, use_profile,
+)
+from proteuscmd.journal import Journal, journal_path, new_job_id
+from proteuscmd.output import FORMATS, Collector, Output
+from proteuscmd.parallel import KeyedExecutor, ordered, run_all
+from proteuscmd.records import mac_key
+from proteuscmd.timings import Timings
 from proteuscmd.types import (
-    IP_TYPE, IP_STATE_TYPE, VIEW_TYPE,
+    IP_TYPE, IP_NETWORK_TYPE, IP_STATE_TYPE, PROFILES_TYPE, VIEW_TYPE,
     ConfigOption, IP_VERSION_CHOICE,
 )
 
 
+if TYPE_CHECKING:
+    # The client pulls in requests which is slow to import and not needed
+    # by offline commands. It is imported when a session is created.
+    # Likewise, the snapshot (sqlite3), DNS sync, daemon, resolver and
+    # address mapping (socket) are imported only by the commands using them.
+    from proteuscmd.api import Proteus
+
 __view_args = {
         'default': 'all',
         'type': VIEW_TYPE,
         'help': 'DNS view structure to operate in'}
 
+# CSV columns of listed entities, properties are columns of their own
+__record_columns = ('view', 'id', 'name', 'type', 'absoluteName', 'addresses',
+                    'linkedRecordName', 'ttl', 'comment')
+__address_columns = ('address', 'name', 'state', 'macAddress', 'admin_email',
+                     'admin_name', 'admin_phone', 'comment', 'id')
+__export_columns = __address_columns + ('hosts',)
+__change_columns = ('view', 'action', 'name', 'targets', 'id', 'status',
+                    'error')
+__result_columns = ('line', 'result', 'resumed', 'error')
+
+
+# Collector of the results of a profile during a fan-out
+_captured = contextvars.ContextVar('captured', default=None)
+
+# Confirmations of concurrently running profiles are asked one by one
+_confirm_lock = threading.Lock()
+
+
+def _output():
+    '''Get the output results of the current command are written to.
+    '''
+    return _captured.get() or click.get_current_context().obj['output']
+
+
+def _confirm(message):
+    '''Ask for confirmation, naming the profile if several are used.
+    '''
+    obj = click.get_current_context().obj
+    fan_out = len(obj.get('profiles') or ()) > 1
+    if fan_out:
+        message = f'[{active_profile()}] {message}'
+    with _confirm_lock:
+        # keep standard output free for the results
+        click.confirm(message, abort=True, err=fan_out)
+
+
+def _run_with_proteus(obj, f, args, kwargs):
+    hooks = [obj['timings']] if obj.get('timings') else []
+    if kwargs.get('offline'):
+        # answered from the local snapshot without any session
+        return f(None, *args, **kwargs)
+    if obj.get('proteus'):
+        # running in daemon with an already open session
+        proteus = obj['proteus']
+        for hook in hooks:
+            proteus.add_hook(hook)
+        try:
+            return f(proteus, *args, **kwargs)
+        finally:
+            for hook in hooks:
+                proteus.remove_hook(hook)
+    with proteus_from_config(obj['cache'], hooks) as proteus:
+        return f(proteus, *args, **kwargs)
+
+
+def _error_message(e):
+    '''Describe an error for the merged document. Failed requests are
+    described without their URL since the one of the login contains the
+    password.
+    '''
+    # if requests has not been imported, no request has failed
+    requests = sys.modules.get('requests')
+    if requests and isinstance(e, requests.RequestException):
+        request = e.request
+        host = urlsplit(request.url).netloc if request else 'server'
+        return f'Request to {host} failed: {type(e).__name__}'
+    return str(e)
+
+
+def _fan_out(ctx, profiles, f, args, kwargs):
+    '''Run a command for several profiles concurrently, each with its own
+    session and connection pool. Returns a document with the result or
+    error of each profile and if any failed. Records streamed by a command
+    are collected as its result.
+    '''
+    # each profile needs its own copy of input files
+    files = {key: (value.read(), getattr(value, 'name', '-'))
+             for key, value in kwargs.items() if hasattr(value, 'read')}
+
+    def run(profile):
+        collector = Collector()
+        _captured.set(collector)
+        own_kwargs = dict(kwargs)
+        for key, (content, name) in files.items():
+            own_kwargs[key] = io.StringIO(content)
+            own_kwargs[key].name = name
+        document = {}
+        try:
+            with ctx.scope(cleanup=False), use_profile(profile):
+                data = _run_with_proteus(ctx.obj, f, args, own_kwargs)
+        except click.exceptions.Exit as e:
+            data = None
+            if e.exit_code:
+                document['exit_code'] = e.exit_code
+        except click.Abort:
+            data = None
+            document['error'] = 'Aborted'
+        except click.ClickException as e:
+            data = None
+            document['error'] = e.format_message()
+        except Exception as e:
+            data = None
+            document['error'] = _error_message(e)
+        if not data:
+            data = collector.records or None
+        if data is not None or not document:
+            document = {'result': data, **document}
+        return document
+
+    documents = run_all({profile: partial(run, profile)
+                         for profile in profiles})
+    failed = any('error' in d or 'exit_code' in d for d in documents.values())
+    return documents, failed
+
 
 def with_proteus(f):
     '''Provide a Proteus client as first parameter of the wraped function.
-    Print the result if one exists.
+    Write the result if one exists.
+    With several profiles, the function is run for each of them and the
+    results are merged into one document.
     '''
     @wraps(f)
     def decorated(*args, **kwargs):
-        with proteus_from_config() as proteus:
-            data = f(proteus, *args, **kwargs)
+        ctx = click.get_current_context()
+        profiles = ctx.obj.get('profiles') or ()
+        if len(profiles) > 1:
+            documents, failed = _fan_out(ctx, profiles, f, args, kwargs)
+            ctx.obj['output'].profiles(documents)
+            if failed:
+                ctx.exit(1)
+            return
+        data = _run_with_proteus(ctx.obj, f, args, kwargs)
         if data:
-            print(json.dumps(data, indent=2))
+            ctx.obj['output'].result(data)
     return decorated
 
 
+@cache
+def _profile_ip_map(profile):
+    '''Compile the mapping configuration of a profile only once.
+    '''
+    from proteuscmd.ipmap import IPMap
+    return IPMap(config('v4_v6_map', profile) or [])
+
+
+def _ip_map():
+    return _profile_ip_map(active_profile())
+
+
 def get_mapped_ip(ip):
     '''Use the mapping configuration to map between IPv4 and IPv6 addresses.
     '''
-    for ip_map in (config('v4_v6_map') or []):
-        ipv4_network = ipaddress.IPv4Network(ip_map['cidr'])
-        ipv6_network = ipaddress.IPv6Network(ip_map['prefix'])
-        if ip.version == 4 and ip in ipv4_network:
-            int_network_address = int(ipv6_network.network_address)
-            int_ip_address = int(ip.ipv6_mapped) & 0xFFFFFFFF
-            return ipaddress.IPv6Address(int_network_address | int_ip_address)
-        if ip.version == 6 and ip in ipv6_network:
-            ipv4_int = int(ip) & 0xFFFFFFFF
-            return ipaddress.IPv4Address(ipv4_int)
-    raise ValueError(f'No mapping found for IP {ip.compressed}')
+    return _ip_map().map(ip)
+
+
+def _resolver():
+    from proteuscmd.resolve import resolver
+    return resolver()
+
+
+def open_snapshot():
+    '''Open the local snapshot for offline queries.
+    '''
+    from proteuscmd.snapshot import Snapshot, snapshot_path
+    path = snapshot_path()
+    if not path.exists():
+        raise click.ClickException(
+                'No snapshot found. Run `proteuscmd snapshot pull` first.')
+    return Snapshot(path)
+
+
+def _requested_view_names(view):
+    if view != 'all':
+        return [view]
+    return list(config('views') or ('intern', 'extern'))
+
+
+__job_options = (
+    click.option('--job', default=new_job_id, show_default='a new ID',
+                 help='Record completed operations under this job ID.'),
+    click.option('--resume', metavar='JOB',
+                 help='Skip operations already completed by this job.'))
+
+
+def _job_options(f):
+    for option in reversed(__job_options):
+        f = option(f)
+    return f
+
+
+def _open_journal(job, resume):
+    '''Open the journal of a new job or of the job to resume.
+    '''
+    if resume:
+        source = click.get_current_context().get_parameter_source('job')
+        if source != ParameterSource.DEFAULT and job != resume:
+            raise click.UsageError(
+                    '--job and --resume must name the same job.')
+        job = resume
+    try:
+        if resume and not journal_path(resume).exists():
+            raise click.ClickException(f'No journal found for job {resume}.')
+        return Journal(job)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+
+def _close_journal(journal, completed):
+    '''Delete the journal of a completed job. Otherwise, tell how to resume.
+    '''
+    if completed:
+        journal.remove()
+        return
+    journal.close()
+    print(f'Job {journal.job} is incomplete. Run again with '
+          f'--resume {journal.job} to continue.', file=sys.stderr)
 
 
 @click.group()
-def cli():
-    pass
+@click.option('--no-cache', is_flag=True, default=False,
+              help='Do not use cached entity IDs.')
+@click.option('--timings', is_flag=True, default=False,
+              help='Print the number and duration of requests per endpoint '
+              'to stderr.')
+@click.option('--trace', type=click.Path(dir_okay=False, writable=True),
+              help='Write all requests as spans to this file.')
+@click.option('--profile', 'profiles', type=PROFILES_TYPE,
+              envvar='PROTEUSCMD_PROFILE',
+              help='Profiles of the configuration file to use, separated by '
+              'commas. Commands are run for all of them concurrently.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Output format. Defaults to JSON for single results and '
+              'to JSON lines for streamed ones.')
+@click.option('--compact', is_flag=True, default=False,
+              help='Print JSON without indentation and spaces.')
+@click.pass_context
+def cli(ctx, no_cache, timings, trace, profiles, fmt, compact):
+    obj = ctx.ensure_object(dict)
+    obj['cache'] = not no_cache
+    obj['output'] = Output(fmt, compact)
+    # terminates JSON arrays, even if a command fails
+    ctx.call_on_close(obj['output'].close)
+    obj['profiles'] = profiles
+    if profiles and len(profiles) == 1:
+        ctx.with_resource(use_profile(profiles[0]))
+    if timings or trace:
+        obj['timings'] = Timings()
+        if timings:
+            ctx.call_on_close(obj['timings'].print_summary)
+        if trace:
+            ctx.call_on_close(partial(obj['timings'].write_trace, trace))
 
 
 @cli.group()
@@ -66,30 +307,129 @@ def ip():
     '''
 
 
+@cli.group(name='cache')
+def cache_group():
+    '''Manage cached entity IDs.
+    '''
+
+
+@cache_group.command(name='clear')
+def cache_clear():
+    '''Remove all cached entity IDs.
+    '''
+    removed = clear_cache()
+    print(f'Removed {removed} cache file(s)')
+
+
+@cli.group(name='snapshot')
+def snapshot_group():
+    '''Manage the local snapshot for offline queries.
+    '''
+
+
+@snapshot_group.command(name='pull')
+@click.option('--view', **__view_args)
+@click.option('--zone', 'zones', multiple=True,
+              help='Zone to pull including all sub-zones. '
+              'Defaults to snapshot_zones from the configuration.')
+@click.option('--network', 'networks', multiple=True, type=IP_NETWORK_TYPE,
+              help='IP range to pull. '
+              'Defaults to snapshot_networks from the configuration.')
+@with_proteus
+def snapshot_pull(proteus: Proteus, view, zones, networks):
+    '''Pull DNS records and IP addresses into the local snapshot.
+
+    Each zone and range is replaced as a whole. Pulling only some of them
+    refreshes these and keeps everything else.
+    '''
+    zones = zones or config('snapshot_zones') or []
+    networks = networks or [IP_NETWORK_TYPE.convert(network, None, None)
+                            for network in config('snapshot_networks') or []]
+    if not zones and not networks:
+        raise click.UsageError('Specify zones or networks to pull.')
+
+    from proteuscmd.snapshot import Snapshot
+    with Snapshot() as snapshot:
+        for name, view_id in proteus.get_requested_views(view):
+            for zone in zones:
+                zone = proteus.absolute_name(zone).lower().rstrip('.')
+                zone_id = proteus.get_zone_id(view_id, zone)
+                records = proteus.iter_records(zone_id, recursive=True)
+                count = snapshot.replace_zone(name, zone, records)
+                _output().write({'view': name, 'zone': zone,
+                                 'records': count})
+        for network in networks:
+            addresses = _iter_export(proteus, network, None)
+            count = snapshot.replace_range(network, addresses)
+            _output().write({'network': str(network), 'addresses': count})
+
+
+@snapshot_group.command(name='status')
+def snapshot_status():
+    '''Show what the local snapshot contains and when it was pulled.
+    '''
+    with open_snapshot() as snapshot:
+        _output().stream(snapshot.pulls())
+
+
 @cli.command(name='version')
 def print_version():
     '''Print the version of proteuscmd
     '''
     print(f'proteuscmd {version}')
     try:
-        url = f'https://pypi.org/pypi/proteuscmd/{version}/json'
-        json = requests.get(url, timeout=2).json()
-        upload_time = json.get('urls', [{}])[0].get('upload_time')
+        upload_time = _release_time()
         if upload_time:
             print(f'  released {upload_time}')
     except IOError:
         pass
 
 
+def _release_time():
+    '''Get the release time of this version from PyPI.
+    The release time never changes and is cached once found.
+    '''
+    path = cache_dir() / 'release.json'
+    try:
+        with open(path, 'r') as f:
+            cached = json.load(f)
+        if cached.get('version') == version:
+            return cached['upload_time']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    import requests
+    url = f'https://pypi.org/pypi/proteuscmd/{version}/json'
+    data = requests.get(url, timeout=2).json()
+    upload_time = data.get('urls', [{}])[0].get('upload_time')
+    if upload_time:
+        release = {'version': version, 'upload_time': upload_time}
+        write_private(path, json.dumps(release))
+    return upload_time
+
+
 @dns.command(name='get')
 @click.option('--view', **__view_args)
+@click.option('--offline', is_flag=True, default=False,
+              help='Answer from the local snapshot.')
 @click.argument('domain')
 @with_proteus
-def dns_get(proteus: Proteus, view, domain):
+def dns_get(proteus: Proteus, view, offline, domain):
     '''Get information about a DNS recotd.
     '''
+    if offline:
+        for src, to in (config('replace') or {}).items():
+            domain = domain.replace(src, to)
+        with open_snapshot() as snapshot:
+            return {name: snapshot.get_record(name, domain)
+                    for name in _requested_view_names(view)}
+    return _dns_get(proteus, view, domain)
+
+
+def _dns_get(proteus, view, domain):
     views = proteus.get_requested_views(view)
-    return {name: proteus.get_record(view, domain) for name, view in views}
+    return run_all({name: partial(proteus.get_record, view, domain)
+                    for name, view in views})
 
 
 @dns.command(name='set')
@@ -100,12 +440,16 @@ def dns_get(proteus: Proteus, view, domain):
 def dns_set(proteus: Proteus, view, domain, target: list[str]):
     '''Set DNS record in Proteus
     '''
-    views = proteus.get_requested_views(view)
-    result = {}
-    for name, view in views:
+    return _dns_set(proteus, view, domain, target)
+
+
+def _dns_set(proteus, view, domain, target):
+    def set_record(view):
         proteus.set_record(view, domain, target)
-        result[name] = proteus.get_record(view, domain)
-    return result
+        return proteus.get_record(view, domain)
+
+    views = proteus.get_requested_views(view)
+    return run_all({name: partial(set_record, view) for name, view in views})
 
 
 @dns.command(name='delete')
@@ -118,91 +462,187 @@ def dns_delete(proteus: Proteus, view, force,  domain):
     '''Delete DNS record in Proteus
     '''
     if not force:
-        click.confirm(f'Do you really want do delete {domain}?', abort=True)
+        _confirm(f'Do you really want do delete {domain}?')
 
+    _dns_delete(proteus, view, domain)
+
+
+def _dns_delete(proteus, view, domain):
     views = proteus.get_requested_views(view)
-    for name, view in views:
-        proteus.delete_record(view, domain)
+    run_all({name: partial(proteus.delete_record, view, domain)
+             for name, view in views})
 
 
-def _ip_get_for_version(proteus, ip, version):
-    """Get IP address info for a specific version, handling IP mapping."""
-    if version:
-        version_int = int(version)
-        if version_int != ip.version:
-            ip = get_mapped_ip(ip)
+@dns.command(name='list')
+@click.option('--view', **__view_args)
+@click.option('--recursive/--no-recursive', default=False, type=bool,
+              help='Include records of all sub-zones.')
+@click.argument('zone')
+@with_proteus
+def dns_list(proteus: Proteus, view, recursive, zone):
+    '''List all host and alias records of a zone.
+    Records are printed as soon as they are retrieved.
+    '''
+    def records(name, zone_id):
+        for record in proteus.iter_records(zone_id, recursive):
+            record['view'] = name
+            yield record
+
+    for name, view_id in proteus.get_requested_views(view):
+        zone_id = proteus.get_zone_id(view_id, zone)
+        _output().stream(records(name, zone_id), __record_columns)
+
+
+@dns.command(name='find')
+@click.option('--target', required=True,
+              help='IP address the records point to. With --offline, this '
+              'may also be the name aliases point to.')
+@click.option('--offline', is_flag=True, default=False,
+              help='Search the local snapshot.')
+@with_proteus
+def dns_find(proteus: Proteus, target, offline):
+    '''Find all DNS records pointing to a target.
+    Records are printed as soon as they are found.
+    '''
+    try:
+        target = ipaddress.ip_address(target)
+    except ValueError:
+        if not offline:
+            raise click.UsageError('Finding aliases requires --offline.')
+        for src, to in (config('replace') or {}).items():
+            target = target.replace(src, to)
+
+    if offline:
+        with open_snapshot() as snapshot:
+            _output().stream(snapshot.find_records(target), __record_columns)
+        return
+
+    conf_id = proteus.get_configuration_id()
+    address = proteus.get_ip_address(target, conf_id)
+    if address['id']:
+        records = proteus.iter_linked_entities(address['id'], 'HostRecord')
+        _output().stream(records, __record_columns)
 
-    data = proteus.get_entities_by_name('default', 0, 'Configuration')
-    conf_id = data[0]['id']
 
-    data = proteus.get_container_by_ip(ip, conf_id)
-    container_id = data["id"]
-    return proteus.get_ip_address(ip, container_id)
+@dns.command(name='sync')
+@click.option('--dry-run', is_flag=True, default=False,
+              help='Only print the planned changes.')
+@click.option('--prune', is_flag=True, default=False,
+              help='Delete records of the affected zones which are not part '
+              'of the desired state.')
+@click.option('--jobs', '-j', cls=ConfigOption, default=1,
+              type=click.IntRange(min=1),
+              help='Number of changes to apply in parallel.')
+@click.argument('file', type=click.File('r'))
+@with_proteus
+def dns_sync(proteus: Proteus, dry_run, prune, jobs, file):
+    '''Bring DNS records into the state described in a JSON or YAML file.
+
+    The current records are compared with the desired ones and only the
+    necessary changes are applied. Changes are printed one by one.
+    '''
+    from proteuscmd import sync
+    try:
+        changes = sync.plan(proteus, sync.load_desired(file), prune)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    def show(change, **kwargs):
+        change = {k: v for k, v in change.items()
+                  if k not in ('view_id', 'record')}
+        _output().write({**change, **kwargs}, __change_columns)
+
+    if dry_run:
+        for change in changes:
+            show(change)
+        return
+
+    failed = False
+    with KeyedExecutor(jobs) as executor:
+        apply = partial(sync.apply, proteus)
+        key = itemgetter('name')
+        for change, future in ordered(executor, changes, key, apply):
+            if future.exception():
+                failed = True
+                show(change, error=str(future.exception()))
+            else:
+                show(change, status='done')
+    if failed:
+        click.get_current_context().exit(1)
+
+
+def _ip_for_version(ip, version):
+    '''Map between IPv4 and IPv6 if version differs from the IP's version.
+    '''
+    if version and int(version) != ip.version:
+        return get_mapped_ip(ip)
+    return ip
+
+
+def _ip_get_for_version(proteus, conf_id, ip, version):
+    """Get IP address info for a specific version, handling IP mapping."""
+    ip = _ip_for_version(ip, version)
+    return proteus.get_ip_address(ip, conf_id)
 
 
 @ip.command(name='get')
 @click.option('--version', required=False, type=IP_VERSION_CHOICE,
+              is_eager=True,
               help='IP version to use. '
               'Will use the mapping configuration if necessary.')
+@click.option('--offline', is_flag=True, default=False,
+              help='Answer from the local snapshot.')
 @click.argument('ip', type=IP_TYPE)
 @with_proteus
-def ip_get(proteus: Proteus, version, ip):
+def ip_get(proteus: Proteus, version, offline, ip):
     '''Get information about IPv4 address
     '''
+    if offline:
+        with open_snapshot() as snapshot:
+            if version == 'both':
+                return {f'v{v}': snapshot.get_ip_address(
+                            _ip_for_version(ip, v)) for v in (4, 6)}
+            return snapshot.get_ip_address(_ip_for_version(ip, version))
+    return _ip_get(proteus, version, ip)
+
+
+def _ip_get(proteus, version, ip):
+    conf_id = proteus.get_configuration_id()
     if version == 'both':
-        return {
-            'v4': _ip_get_for_version(proteus, ip, 4),
-            'v6': _ip_get_for_version(proteus, ip, 6),
-        }
-    return _ip_get_for_version(proteus, ip, version)
+        return run_all({
+            'v4': partial(_ip_get_for_version, proteus, conf_id, ip, 4),
+            'v6': partial(_ip_get_for_version, proteus, conf_id, ip, 6),
+        })
+    return _ip_get_for_version(proteus, conf_id, ip, version)
 
 
-def _ip_set_for_version(proteus, name, admin_email, admin_name, admin_phone,
-                        comment, state, hostname, view, prop, force,
-                        ip, mac, version=None):
+def _ip_set_for_version(proteus, conf_id, view_ids, props, state, hostname,
+                        force, ip, mac, version=None):
     """Assign an IP address for a specific version, handling IP mapping.
 
     If `version` differs from the IP's actual version, the IP is mapped.
+    Configuration and views are resolved by the caller once for all versions.
     """
-    # Map between IPv4 and IPv6 if necessary
-    if version:
-        version_int = int(version)
-        if version_int != ip.version:
-            ip = get_mapped_ip(ip)
-
-    # get network information
-    data = proteus.get_entities_by_name('default', 0, 'Configuration')
-    conf_id = data[0]['id']
-
-    container_id = proteus.get_container_by_ip(ip, conf_id)['id']
+    ip = _ip_for_version(ip, version)
 
     # check if ip is already reserved
-    existing_address = proteus.get_ip_address(ip, container_id)
+    existing_address = proteus.get_ip_address(ip, conf_id)
     if existing_address['id']:
+        if proteus.is_assigned(existing_address, state, mac, props,
+                               hostname):
+            # nothing to do, e.g. when running an interrupted job again
+            return existing_address
         if not force:
             raise ValueError('IP already reserved')
-        proteus.delete_ip_address(ip, container_id)
-
-    # prepare properties
-    props = {'admin_email': admin_email,
-             'admin_name': admin_name,
-             'admin_phone': admin_phone,
-             'comment': comment}
-    if name or hostname:
-        # Name defaults to hostname
-        props['name'] = name or hostname
-    for extra_prop in prop:
-        k, v = extra_prop.split('=', 1)
-        props[k] = v
-    props = {k: v for k, v in props.items() if v}
+        proteus.delete_entity(existing_address['id'])
 
     if ip.version == 4:
-        proteus.assign_ip4_address(conf_id, state, ip, mac, props,
-                                   hostname, view)
-    else:
-        proteus.assign_ip6_address(container_id, state, ip, mac, props,
-                                   hostname, view)
-    return proteus.get_ip_address(ip, container_id)
+        return proteus.assign_ip4_address(conf_id, state, ip, mac, props,
+                                          hostname, view_ids)
+    # IPv6 addresses are created in their network
+    container_id = proteus.get_container_by_ip(ip, conf_id)['id']
+    return proteus.assign_ip6_address(container_id, state, ip, mac, props,
+                                      hostname, view_ids)
 
 
 @ip.command(name='set')
@@ -226,6 +666,7 @@ def _ip_set_for_version(proteus, name, admin_email, admin_name, admin_phone,
 @click.option('--force/--no-force', default=False, type=bool,
               help='If to overwrite existing IP assignments')
 @click.option('--version', required=False, type=IP_VERSION_CHOICE,
+              is_eager=True,
               help='IP version to use. '
               'Will use the mapping configuration if necessary.')
 @click.argument('ip', type=IP_TYPE)
@@ -235,40 +676,56 @@ def ip_set(proteus: Proteus, name, admin_email, admin_name, admin_phone,
            comment, state, hostname, view, prop, force, version, ip, mac):
     '''Assign IPv4 or IPv6 address
     '''
+    return _ip_set(proteus, name, admin_email, admin_name, admin_phone,
+                   comment, state, hostname, view, prop, force, version, ip,
+                   mac)
+
+
+def _ip_properties(name, admin_email, admin_name, admin_phone, comment,
+                   hostname, prop):
+    props = {'admin_email': admin_email,
+             'admin_name': admin_name,
+             'admin_phone': admin_phone,
+             'comment': comment}
+    if name or hostname:
+        # Name defaults to hostname
+        props['name'] = name or hostname
+    for extra_prop in prop:
+        k, v = extra_prop.split('=', 1)
+        props[k] = v
+    return {k: v for k, v in props.items() if v}
+
+
+def _ip_set(proteus, name, admin_email, admin_name, admin_phone, comment,
+            state, hostname, view, prop, force, version, ip, mac):
+    props = _ip_properties(name, admin_email, admin_name, admin_phone,
+                           comment, hostname, prop)
+    conf_id = proteus.get_configuration_id()
+    view_ids = []
+    if hostname:
+        view_ids = [view_id for _, view_id in
+                    proteus.get_requested_views(view)]
+    set_for_version = partial(_ip_set_for_version, proteus, conf_id,
+                              view_ids, props, state, hostname, force, ip,
+                              mac)
     if version == 'both':
-        return {
-            'v4': _ip_set_for_version(proteus, name, admin_email, admin_name,
-                                      admin_phone, comment, state, hostname,
-                                      view, prop, force, ip, mac, 4),
-            'v6': _ip_set_for_version(proteus, name, admin_email, admin_name,
-                                      admin_phone, comment, state, hostname,
-                                      view, prop, force, ip, mac, 6),
-        }
-    return _ip_set_for_version(proteus, name, admin_email, admin_name,
-                               admin_phone, comment, state, hostname, view,
-                               prop, force, ip, mac, version)
-
-
-def _ip_delete_for_version(proteus, force, ip, version=None):
+        return run_all({
+            'v4': partial(set_for_version, 4),
+            'v6': partial(set_for_version, 6),
+        })
+    return set_for_version(version)
+
+
+def _ip_delete_for_version(proteus, conf_id, ip, version=None):
     """Delete an IP assignment for a specific version, handling mapping.
 
     If `version` differs from the IP's actual version, the IP is mapped.
     """
-    # Map between IPv4 and IPv6 if necessary
-    if version:
-        version_int = int(version)
-        if version_int != ip.version:
-            ip = get_mapped_ip(ip)
-
-    if not force:
-        click.confirm(f'Do you really want do delete {ip}?', abort=True)
-
-    # get network information
-    data = proteus.get_entities_by_name('default', 0, 'Configuration')
-    conf_id = data[0]['id']
-    container_id = proteus.get_container_by_ip(ip, conf_id)['id']
-
-    proteus.delete_ip_address(ip, container_id)
+    ip = _ip_for_version(ip, version)
+    address = proteus.get_ip_address(ip, conf_id)
+    if not address['id']:
+        raise ValueError(f'IP {ip.compressed} is not assigned')
+    proteus.delete_entity(address['id'])
     return {'status': 'deleted', 'ip': ip.compressed}
 
 
@@ -276,6 +733,7 @@ def _ip_delete_for_version(proteus, force, ip, version=None):
 @click.option('--force/--no-force', default=False, type=bool,
               help='Force will skip any additional confirmation.')
 @click.option('--version', required=False, type=IP_VERSION_CHOICE,
+              is_eager=True,
               help='IP version to use. '
               'Will use the mapping configuration if necessary.')
 @click.argument('ip', type=IP_TYPE)
@@ -283,25 +741,513 @@ def _ip_delete_for_version(proteus, force, ip, version=None):
 def ip_delete(proteus: Proteus, force, version, ip):
     '''Delete assigned IPv4 or IPv6 address
     '''
+    return _ip_delete(proteus, force, version, ip)
+
+
+def _ip_delete(proteus, force, version, ip):
+    versions = (4, 6) if version == 'both' else (version,)
+    if not force:
+        # Ask for confirmation before deleting anything in parallel
+        for mapped_version in versions:
+            mapped_ip = _ip_for_version(ip, mapped_version)
+            _confirm(f'Do you really want do delete {mapped_ip}?')
+
+    conf_id = proteus.get_configuration_id()
     if version == 'both':
-        return {
-            'v4': _ip_delete_for_version(proteus, force, ip, 4),
-            'v6': _ip_delete_for_version(proteus, force, ip, 6),
-        }
-    return _ip_delete_for_version(proteus, force, ip, version)
+        return run_all({
+            'v4': partial(_ip_delete_for_version, proteus, conf_id, ip, 4),
+            'v6': partial(_ip_delete_for_version, proteus, conf_id, ip, 6),
+        })
+    return _ip_delete_for_version(proteus, conf_id, ip, version)
+
+
+def _find_addresses(proteus, mac, properties):
+    '''Search addresses on the server. A MAC address alone is looked up
+    directly, otherwise the properties are searched for.
+    '''
+    if not properties:
+        conf_id = proteus.get_configuration_id()
+        yield from proteus.iter_addresses_by_mac(conf_id, mac)
+        return
+    for object_type in ('IP4Address', 'IP6Address'):
+        for address in proteus.iter_custom_search(object_type, properties):
+            if not mac or mac_key(address.mac or '') == mac_key(mac):
+                yield address
+
+
+@ip.command(name='find')
+@click.option('--mac', help='MAC address the addresses are assigned to.')
+@click.option('--admin-email', '-e', help='Email address of the host admin.')
+@click.option('--prop', default=[], multiple=True,
+              help='Property values in the form of property=value')
+@click.option('--offline', is_flag=True, default=False,
+              help='Search the local snapshot.')
+@with_proteus
+def ip_find(proteus: Proteus, mac, admin_email, prop, offline):
+    '''Find assigned IPv4 and IPv6 addresses.
+
+    Addresses are found by MAC address and property values. If several are
+    given, all of them must match. Addresses are printed as soon as they
+    are found.
+    '''
+    properties = {'admin_email': admin_email} if admin_email else {}
+    for extra_prop in prop:
+        if '=' not in extra_prop:
+            raise click.BadParameter(f'{extra_prop!r} is not property=value',
+                                     param_hint='--prop')
+        k, v = extra_prop.split('=', 1)
+        properties[k] = v
+    if not mac and not properties:
+        raise click.UsageError('Specify a MAC address or properties.')
+
+    if offline:
+        with open_snapshot() as snapshot:
+            try:
+                _output().stream(snapshot.find_addresses(mac, properties),
+                                 __address_columns)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        return
+
+    _output().stream(_find_addresses(proteus, mac, properties),
+                     __address_columns)
+
+
+@ip.command(name='provision')
+@click.option('--input-format', 'fmt', type=click.Choice(('ndjson', 'csv')),
+              help='Input format. Defaults to csv for files ending in .csv '
+              'and to JSON lines (ndjson) otherwise.')
+@click.option('--state', '-s', default='DHCP_RESERVED', type=IP_STATE_TYPE,
+              help='Type of IP assignment')
+@click.option('--view', **__view_args)
+@click.option('--force/--no-force', default=False, type=bool,
+              help='If to overwrite existing IP assignments')
+@click.option('--version', required=False, type=IP_VERSION_CHOICE,
+              help='IP version to use. '
+              'Will use the mapping configuration if necessary.')
+@click.option('--jobs', '-j', cls=ConfigOption, default=1,
+              type=click.IntRange(min=1),
+              help='Number of addresses to assign in parallel.')
+@_job_options
+@click.argument('file', type=click.File('r'), default='-')
+@with_proteus
+def ip_provision(proteus: Proteus, fmt, state, view, force, version, jobs,
+                 job, resume, file):
+    '''Assign many IPv4 and IPv6 addresses from a file.
+
+    Each line describes one host with the fields ip and mac and optionally
+    hostname, name, comment, prop and the admin fields of `ip set`.
+    Configuration and views are looked up once and IPv6 addresses are
+    grouped by network. Results are printed in the order of the input.
+
+    Completed assignments are recorded in a journal. If the job fails, it
+    can be continued with --resume. Addresses already assigned as requested
+    are not changed.
+    '''
+    if not fmt:
+        fmt = 'csv' if file.name.endswith('.csv') else 'ndjson'
+    journal = _open_journal(job, resume)
+    failed = True
+    try:
+        failed = _provision(proteus, fmt, state, view, force, version, jobs,
+                            file, journal)
+    finally:
+        _close_journal(journal, not failed)
+    if failed:
+        click.get_current_context().exit(1)
+
+
+def _provision(proteus, fmt, state, view, force, version, jobs, file,
+               journal):
+    '''Run ip provision and return if anything failed.
+    '''
+    from concurrent.futures import Future
+    from proteuscmd.batch import read_operations
+
+    def record(op, name, line, future):
+        if not future.exception():
+            journal.record(op, future.result(), name, line)
+
+    versions = (4, 6) if version == 'both' else (version,)
+    conf_id = proteus.get_configuration_id()
+    view_ids = None
+
+    # futures of all versions per line, IPv6 assignments are collected to
+    # be submitted together
+    lines = []
+    ip6_assignments, ip6_pending = [], []
+    with KeyedExecutor(jobs) as executor:
+        operations = _resolver().prefetch(read_operations(file, fmt), _op_ip)
+        for line, op in operations:
+            pending = {}
+            lines.append((line, pending))
+            try:
+                if isinstance(op, Exception):
+                    raise op
+                ip = _resolver().resolve(str(op['ip']), version)
+                hostname = op.get('hostname')
+                admin = {}
+                for key in ('admin_email', 'admin_name', 'admin_phone'):
+                    admin[key] = op.get(key) or config(key)
+                    if not admin[key]:
+                        raise ValueError(f'Missing field {key!r}')
+                props = _ip_properties(op.get('name'), **admin,
+                                       comment=op.get('comment'),
+                                       hostname=hostname,
+                                       prop=op.get('prop', []))
+                if hostname and view_ids is None:
+                    view_ids = [view_id for _, view_id in
+                                proteus.get_requested_views(view)]
+                resumed = set()
+                for ip_version in versions:
+                    mapped_ip = _ip_for_version(ip, ip_version)
+                    name = f'v{mapped_ip.version}'
+                    done, result = journal.completed(op, name, line)
+                    if done:
+                        pending[name] = Future()
+                        pending[name].set_result(result)
+                        resumed.add(name)
+                        continue
+                    if mapped_ip.version == 4:
+                        pending[name] = executor.submit(
+                                mapped_ip, _ip_set_for_version, proteus,
+                                conf_id, view_ids, props, state, hostname,
+                                force, mapped_ip, op['mac'])
+                        pending[name].add_done_callback(
+                                partial(record, op, name, line))
+                        continue
+                    ip6_assignments.append({
+                        'status': state, 'ip': mapped_ip, 'mac': op['mac'],
+                        'properties': props, 'hostname': hostname,
+                        'view_ids': view_ids or ()})
+                    ip6_pending.append((pending, name, op, line))
+                if resumed and resumed == pending.keys():
+                    pending['resumed'] = True
+            except KeyError as e:
+                pending['error'] = f'Missing field {e}'
+            except Exception as e:
+                pending['error'] = str(e)
+
+        futures = proteus.assign_ip6_addresses(conf_id, ip6_assignments,
+                                               executor, force)
+        for (pending, name, op, line), future in zip(ip6_pending, futures):
+            pending[name] = future
+            future.add_done_callback(partial(record, op, name, line))
+
+        failed = False
+        for line, pending in lines:
+            result = {'line': line}
+            errors = [pending.pop('error')] if 'error' in pending else []
+            resumed = pending.pop('resumed', False)
+            for name, future in pending.items():
+                if future.exception():
+                    errors.append(f'{name}: {future.exception()}')
+                else:
+                    result.setdefault('result', {})[name] = \
+                        future.result()
+            if len(versions) == 1 and 'result' in result:
+                result['result'] = next(iter(result['result'].values()))
+            if resumed:
+                result['resumed'] = True
+            if errors:
+                result['error'] = '; '.join(errors)
+                failed = True
+            _output().write(result, __result_columns)
+    return failed
+
+
+@ip.command(name='list')
+@click.argument('network', type=IP_NETWORK_TYPE)
+@with_proteus
+def ip_list(proteus: Proteus, network):
+    '''List all assigned addresses of an IPv4 or IPv6 network.
+    Addresses are printed as soon as they are retrieved. Use `ip export` for
+    ranges spanning multiple networks.
+    '''
+    conf_id = proteus.get_configuration_id()
+    found = proteus.get_network(network, conf_id)
+    if not found:
+        raise click.ClickException(
+                f'No network containing all of {network} could be found. '
+                'Use `ip export` for ranges spanning multiple networks.')
+    network_id, _ = found
+    addresses = proteus.iter_ip_addresses(network_id, network.version)
+    _output().stream(addresses, __address_columns)
+
+
+def _iter_export(proteus, network, resume):
+    '''Stream all addresses within network in ascending order together with
+    the CIDR of the network they are part of. With resume, only addresses
+    after it are streamed.
+    '''
+    conf_id = proteus.get_configuration_id()
+    for network_id, cidr in proteus.iter_networks(network, conf_id):
+        if resume and int(cidr.broadcast_address) <= int(resume):
+            continue
+        # Proteus returns addresses in the order they were created, so the
+        # addresses of each network are sorted before they are written
+        addresses = []
+        for address in proteus.iter_ip_addresses(network_id, cidr.version):
+            ip = ipaddress.ip_address(address.address)
+            if ip in network and not (resume and int(ip) <= int(resume)):
+                addresses.append((int(ip), address))
+        addresses.sort(key=itemgetter(0))
+        for _, address in addresses:
+            address['network'] = str(cidr)
+            yield address
+
+
+@ip.command(name='export')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Output format. Same as the global --format.')
+@click.option('--with-hosts', is_flag=True, default=False,
+              help='Include names of host records linked to the addresses.')
+@click.option('--resume', type=IP_TYPE,
+              help='Continue an interrupted export after this address, e.g. '
+              'the last exported one. CSV is written without header to be '
+              'appended.')
+@click.option('--jobs', '-j', cls=ConfigOption, default=1,
+              type=click.IntRange(min=1),
+              help='Number of host record lookups to run in parallel.')
+@click.argument('network', type=IP_NETWORK_TYPE)
+@with_proteus
+def ip_export(proteus: Proteus, fmt, with_hosts, resume, jobs, network):
+    '''Export all assigned addresses of an IPv4 or IPv6 range.
+
+    The range may span multiple networks. Addresses are exported in
+    ascending order, one address per line. Each network is written as soon
+    as its addresses are retrieved.
+    '''
+    def hosts(address):
+        linked = proteus.iter_linked_entities(address['id'], 'HostRecord')
+        return [host.absolute_name for host in linked]
+
+    def with_results(results):
+        for address, future in results:
+            address['hosts'] = future.result()
+            yield address
+
+    if fmt:
+        click.get_current_context().obj['output'].fmt = fmt
+    addresses = _iter_export(proteus, network, resume)
+    with KeyedExecutor(jobs) as executor:
+        if with_hosts:
+            addresses = with_results(
+                    ordered(executor, addresses, id, hosts, jobs * 4))
+        _output().stream(addresses, __export_columns, header=not resume)
 
 
 @ip.command(name='map')
-@click.argument('ip', type=IP_TYPE)
-def ip_map(ip):
+@click.option('--file', '-f', type=click.File('r'),
+              help='File with one address per line to map. Use - for stdin.')
+@click.argument('ip', type=IP_TYPE, required=False)
+def ip_map(file, ip):
     '''Map between IPv4 and IPv6 addresses.
+
+    Instead of a single address, a whole list of addresses can be mapped
+    using --file. The mapped addresses are printed in the same order. For
+    addresses which cannot be mapped, an empty line is printed.
+    '''
+    if ip:
+        mapped = get_mapped_ip(ip)
+        if mapped:
+            print(mapped.compressed)
+        return
+    if not file:
+        raise click.UsageError('Specify an address or a file to map.')
+
+    ip_map = _ip_map()
+    failed = False
+    for line in _resolver().prefetch(file, str.strip):
+        value = line.strip()
+        if not value:
+            continue
+        try:
+            mapped = ip_map.map_text(value)
+            if mapped is None:
+                # not an address but possibly a hostname
+                address = _resolver().resolve(value)
+                mapped = ip_map.map(address).compressed
+            sys.stdout.write(mapped + '\n')
+        except (ValueError, click.BadParameter) as e:
+            print(e, file=sys.stderr)
+            sys.stdout.write('\n')
+            failed = True
+    if failed:
+        click.get_current_context().exit(1)
+
+
+def _batch_run(proteus, op):
+    '''Run a single batch operation using the same logic as the commands.
+    '''
+    command = ' '.join(op.get('command', '').split())
+    view = op.get('view', 'all')
+    version = op.get('version')
+
+    if command == 'dns get':
+        return _dns_get(proteus, view, op['domain'])
+    if command == 'dns set':
+        return _dns_set(proteus, view, op['domain'], op['target'])
+    if command == 'dns delete':
+        _dns_delete(proteus, view, op['domain'])
+        return {'status': 'deleted', 'domain': op['domain']}
+
+    if command not in ('ip get', 'ip set', 'ip delete'):
+        raise ValueError(f'Unknown command: {command!r}')
+    ip = _resolver().resolve(str(op['ip']), version)
+
+    if command == 'ip get':
+        return _ip_get(proteus, version, ip)
+    if command == 'ip delete':
+        return _ip_delete(proteus, True, version, ip)
+
+    admin = {}
+    for key in ('admin_email', 'admin_name', 'admin_phone'):
+        admin[key] = op.get(key) or config(key)
+        if not admin[key]:
+            raise ValueError(f'Missing field {key!r}')
+    return _ip_set(proteus, op.get('name'), admin['admin_email'],
+                   admin['admin_name'], admin['admin_phone'],
+                   op.get('comment'), op.get('state', 'DHCP_RESERVED'),
+                   op.get('hostname'), view, op.get('prop', []),
+                   op.get('force', False), version, ip, op['mac'])
+
+
+def _op_ip(item):
+    '''Get the address or host name of a batch operation.
+    '''
+    _, op = item
+    if isinstance(op, dict) and op.get('ip'):
+        return str(op['ip'])
+
+
+def _batch_key(item):
+    '''Modifications of the same domain or IP address must not run at the
+    same time. Lookups can always run in parallel.
+    '''
+    line, op = item
+    if isinstance(op, Exception) or op.get('command', '').endswith('get'):
+        return line
+    if op.get('domain'):
+        return str(op['domain']).lower().rstrip('.')
+    return str(op.get('ip', line))
+
+
+@cli.command(name='batch')
+@click.option('--input-format', 'fmt', type=click.Choice(('ndjson', 'csv')),
+              help='Input format. Defaults to csv for files ending in .csv '
+              'and to JSON lines (ndjson) otherwise.')
+@click.option('--continue-on-error', is_flag=True, default=False,
+              help='Continue with the next operation if one fails.')
+@click.option('--jobs', '-j', cls=ConfigOption, default=1,
+              type=click.IntRange(min=1),
+              help='Number of operations to run in parallel.')
+@_job_options
+@click.argument('file', type=click.File('r'), default='-')
+@with_proteus
+def batch(proteus: Proteus, fmt, continue_on_error, jobs, job, resume, file):
+    '''Run DNS and IP operations from a file in a single session.
+
+    Each line describes one operation like `dns set`, `dns get`,
+    `dns delete`, `ip set`, `ip get` or `ip delete` with the command line
+    arguments as fields. Results are printed in the order of the input.
+
+    Completed modifications are recorded in a journal. If the job fails, it
+    can be continued with --resume, skipping all completed operations.
+    '''
+    if not fmt:
+        fmt = 'csv' if file.name.endswith('.csv') else 'ndjson'
+    journal = _open_journal(job, resume)
+    failed = True
+    try:
+        failed = _batch(proteus, fmt, continue_on_error, jobs, file, journal)
+    finally:
+        _close_journal(journal, not failed)
+    if failed:
+        click.get_current_context().exit(1)
+
+
+def _batch(proteus, fmt, continue_on_error, jobs, file, journal):
+    '''Run a batch and return if anything failed.
+    '''
+    from proteuscmd.batch import read_operations
+
+    def run(item):
+        line, op = item
+        if isinstance(op, Exception):
+            raise op
+        # lookups are not recorded since their results may change
+        if op.get('command', '').endswith('get'):
+            return _batch_run(proteus, op), False
+        done, result = journal.completed(op, line=line)
+        if done:
+            return result, True
+        result = _batch_run(proteus, op)
+        journal.record(op, result, line=line)
+        return result, False
+
+    failed = False
+    # resolve host names ahead instead of one after another
+    operations = _resolver().prefetch(read_operations(file, fmt), _op_ip)
+    with KeyedExecutor(jobs) as executor:
+        results = ordered(executor, operations, _batch_key, run, jobs * 4)
+        for (line, _), future in results:
+            try:
+                data, resumed = future.result()
+                result = {'line': line, 'result': data}
+                if resumed:
+                    result['resumed'] = True
+            except KeyError as e:
+                result = {'line': line, 'error': f'Missing field {e}'}
+            except Exception as e:
+                result = {'line': line, 'error': str(e)}
+            _output().write(result, __result_columns)
+            if 'error' in result:
+                failed = True
+                if not continue_on_error:
+                    results.close()
+                    break
+    return failed
+
+
+def _run_in_daemon(proteus, args):
+    '''Run a command forwarded to the daemon using its open session.
+    Returns the exit code.
+    '''
+    try:
+        rv = cli.main(args, prog_name='proteuscmd', standalone_mode=False,
+                      obj={'proteus': proteus})
+        return rv if isinstance(rv, int) else 0
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        print('Aborted!', file=sys.stderr)
+        return 1
+
+
+@cli.command(name='daemon')
+def run_daemon():
+    '''Keep an authenticated session open and run commands in it.
+
+    While the daemon is running, all other proteuscmd invocations of the
+    same user are transparently forwarded to it. Set PROTEUSCMD_NO_DAEMON
+    to run a command locally anyway.
     '''
-    mapped = get_mapped_ip(ip)
-    if mapped:
-        print(mapped.compressed)
+    from proteuscmd import daemon
+    with proteus_from_config() as proteus:
+        try:
+            daemon.serve(proteus, partial(_run_in_daemon, proteus),
+                         config('daemon_refresh') or 600)
+        except KeyboardInterrupt:
+            pass
 
 
 def main():
+    from proteuscmd import daemon
+    exit_code = daemon.forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
     cli()
 
 
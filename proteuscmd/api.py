@@ -1,5 +1,31 @@
 import ipaddress
 import requests
+import threading
+import time
+
+from concurrent.futures import Future
+from functools import partial
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+from urllib3.util.retry import Retry
+
+from proteuscmd.parallel import run_all
+from proteuscmd.records import (
+    Record, format_properties, mac_key, parse_properties,
+)
+from proteuscmd.throttle import Throttle, retry_after
+
+
+class ProteusError(Exception):
+    '''Error response from Proteus.
+    The message names the endpoint only, never the request parameters,
+    since those of the login contain the password.
+    '''
+
+    def __init__(self, path, response):
+        self.status = response.status_code
+        self.text = response.text
+        super().__init__(f'Error from requesting {path}: {response.text}')
 
 
 class Proteus:
@@ -9,19 +35,75 @@ class Proteus:
     __base_url: str = ''
     __replacements: dict[str, str] = {}
     __auth_header: dict[str, str] = {}
-
-    def __init__(self, user, password, base_url, replacements):
+    __timeout: tuple[float, float] = (10, 30)
+
+    def __init__(self, user, password, base_url, replacements, http=None,
+                 cache=None, token_cache=None, hooks=None,
+                 configuration='default', views=('intern', 'extern')):
+        '''The password may also be a function returning the password.
+        It is only called if it is actually needed to log in.
+        Hooks are called after each request, see add_hook.
+        Configuration and views are the names of the entities to work in.
+        '''
+        self.__configuration = configuration
+        self.__views = tuple(views)
         self.__user = user
         self.__password = password
         self.__base_url = base_url
-        self.__replacements = replacements
+        self.__replacements = replacements or {}
+        self.__session = self.__create_session(http or {})
+        self.__cache = cache
+        self.__verified = set()
+        self.__token_cache = token_cache
+        self.__login_lock = threading.Lock()
+        self.__hooks = list(hooks or [])
 
     def __enter__(self):
         self.login()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.logout()
+        try:
+            # keep cached sessions alive for the next invocation
+            if not self.__token_cache:
+                self.logout()
+        finally:
+            self.__session.close()
+            if self.__cache:
+                self.__cache.save()
+
+    def __create_session(self, http):
+        '''Create a pooled keep-alive session.
+        Connection errors are retried for all requests since nothing has been
+        sent yet. Gateway errors are retried only for idempotent methods.
+        500 is not retried since Proteus reports ordinary errors like missing
+        entities this way. Overload responses (429, 503) are handled by
+        __send.
+        '''
+        self.__timeout = (http.get('connect_timeout', 10),
+                          http.get('timeout', 30))
+        self.__retries = http.get('retries', 3)
+        self.__backoff_factor = http.get('backoff_factor', 0.3)
+        retry = Retry(total=self.__retries,
+                      backoff_factor=self.__backoff_factor,
+                      status_forcelist=(502, 504),
+                      allowed_methods=('GET', 'DELETE'),
+                      # overload is handled by the throttle for all threads
+                      respect_retry_after_header=False,
+                      raise_on_status=False)
+        pool_size = http.get('pool_size', 10)
+        self.__throttle = Throttle(
+                rate=http.get('rate_limit'),
+                burst=http.get('burst'),
+                max_concurrency=http.get('max_concurrency', pool_size),
+                latency_factor=http.get('latency_factor', 3))
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     def __url(self, path):
         '''Build URL based on configuration.
@@ -29,40 +111,103 @@ class Proteus:
         path = path.lstrip('/')
         return f'{self.__base_url}/Services/REST/v1/{path}'
 
-    def __post(self, path, params):
-        response = requests.post(self.__url(path),
-                                 params=params,
-                                 headers=self.__auth_header,
-                                 timeout=30)
+    def add_hook(self, hook):
+        '''Call hook after each request with a dict describing the call:
+        method, endpoint, status (None on connection errors), request_bytes,
+        response_bytes, start (Unix time) and duration (seconds).
+        Parameters are not passed on since they may contain the password.
+        '''
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.__hooks.remove(hook)
+
+    def __call_hooks(self, method, path, params, start, duration, response):
+        call = {'method': method,
+                'endpoint': path,
+                'status': None,
+                'request_bytes': len(urlencode(params or {}, doseq=True)),
+                'response_bytes': 0,
+                'start': start,
+                'duration': duration}
+        if response is not None:
+            call['status'] = response.status_code
+            call['response_bytes'] = len(response.content)
+        for hook in self.__hooks:
+            hook(call)
+
+    def __send(self, method, path, params, headers, body=None):
+        '''Send a request through the throttle.
+        If the server is overloaded, all requests are paused for the time
+        requested by Retry-After or with exponential backoff and the request
+        is retried. It has not been processed in this case, so this is safe
+        for all methods.
+        '''
+        for attempt in range(self.__retries + 1):
+            start, counter = time.time(), time.perf_counter()
+            response = None
+            slot = self.__throttle.acquire()
+            try:
+                response = self.__session.request(method,
+                                                  self.__url(path),
+                                                  params=params,
+                                                  json=body,
+                                                  headers=headers,
+                                                  timeout=self.__timeout)
+            finally:
+                overloaded = response is not None \
+                    and response.status_code in (429, 503)
+                self.__throttle.release(slot, overloaded)
+                if self.__hooks:
+                    duration = time.perf_counter() - counter
+                    self.__call_hooks(method, path, params, start, duration,
+                                      response)
+            if not overloaded or attempt == self.__retries:
+                return response
+            backoff = self.__backoff_factor * 2 ** attempt
+            self.__throttle.pause(min(retry_after(response, backoff), 300))
+
+    def __request(self, method, path, params, relogin=True, body=None):
+        auth_header = self.__auth_header
+        response = self.__send(method, path, params, auth_header, body)
+        if response.status_code == 401 and relogin and self.__token_cache \
+                and path != 'login':
+            # the cached session has expired
+            self.__relogin(auth_header)
+            return self.__request(method, path, params, relogin=False,
+                                  body=body)
         if response.status_code >= 300:
-            raise Exception(f'Error from requesting {path}: {response.text}')
-        return response.json()
+            if self.__cache and 'not found' in response.text.lower():
+                # A cached ID may be stale. Start fresh next time.
+                self.__cache.invalidate()
+            raise ProteusError(path, response)
+        return response
+
+    def __post(self, path, params):
+        return self.__request('POST', path, params).json()
 
     def __get(self, path, params):
-        response = requests.get(self.__url(path),
-                                params=params,
-                                headers=self.__auth_header,
-                                timeout=30)
-        if response.status_code >= 300:
-            raise Exception(f'Error from requesting {path}: {response.text}')
-        return response.json()
+        return self.__request('GET', path, params).json()
 
     def __delete(self, path, params):
-        response = requests.delete(self.__url(path),
-                                   params=params,
-                                   headers=self.__auth_header,
-                                   timeout=30)
-        if response.status_code >= 300:
-            raise Exception(f'Error from requesting {path}: {response.text}')
-        return response
+        return self.__request('DELETE', path, params)
+
+    def __put(self, path, body):
+        return self.__request('PUT', path, None, body=body)
 
     def __parse_domain(self, domain):
-        for src, to in self.__replacements.items():
-            domain = domain.replace(src, to)
+        domain = self.absolute_name(domain)
         fragments = list(filter(bool, domain.split('.')[::-1]))
         return fragments[:-1], fragments[-1]
 
-    def __record_type_from_target(self, targets):
+    def absolute_name(self, domain):
+        '''Apply the configured replacements to a domain name.
+        '''
+        for src, to in self.__replacements.items():
+            domain = domain.replace(src, to)
+        return domain
+
+    def record_type_from_target(self, targets):
         '''Return type of record based on the target.
         HostRecord if the target is an IP address,
         AliasRecord if it is a domain
@@ -76,22 +221,113 @@ class Proteus:
                 raise ValueError('Multiple targets must all be IP addresses')
             return 'AliasRecord'
 
-    def __parse_properties(self, properties):
-        '''Take the property string returned by Proteus and turn it into a
-        dictionary containing the key-value pairs.
+    def __cached_id(self, key, name, parent, object_type):
+        '''Get the ID of an entity by name, using the cache if possible.
+        Returns None if the entity does not exist.
+        '''
+        entity_id = self.__cache.get(key) if self.__cache else None
+        if entity_id is None:
+            data = self.get_entities_by_name(name, parent, object_type)
+            if not data:
+                return None
+            entity_id = data[0]['id']
+            self.__verified.add(entity_id)
+            if self.__cache:
+                self.__cache.set(key, entity_id)
+        return entity_id
+
+    def __is_stale(self, entity_id):
+        '''Check if an entity ID taken from the cache no longer exists.
+        The cache is invalidated if that is the case.
+        '''
+        if not self.__cache or entity_id in self.__verified:
+            return False
+        entity = self.__get('getEntityById', {'id': entity_id})
+        if entity.get('id'):
+            self.__verified.add(entity_id)
+            return False
+        self.__cache.invalidate()
+        return True
+
+    def __search_zone(self, view, zones):
+        '''Find a zone of a view with a single search by its absolute name.
+        Returns None if there is no exact match or if the server does not
+        support the search.
+        '''
+        absolute_name = '.'.join(zones[::-1]).lower()
+        params = {'containerId': view,
+                  'count': 10,
+                  'options': f'hint={absolute_name}',
+                  'start': 0}
+        try:
+            data = self.__get('getZonesByHint', params)
+        except ProteusError:
+            return None
+        for zone in data:
+            properties = parse_properties(zone.get('properties') or '')
+            if properties.get('absoluteName', '').lower() == absolute_name:
+                return zone['id']
+        return None
+
+    def __zone_id(self, view, zones, retry=True):
+        '''Get the ID of the zone given by its labels in reverse order.
+        If the zone is neither cached nor a top-level zone, a single search
+        is tried before navigating through the zones label by label.
+        '''
+        key = f'Zone:{view}:{".".join(zones)}'
+        cached = self.__cache.get(key) if self.__cache else None
+        if cached is not None:
+            return cached
+        if len(zones) > 1:
+            zone_id = self.__search_zone(view, zones)
+            if zone_id is not None:
+                self.__verified.add(zone_id)
+                if self.__cache:
+                    self.__cache.set(key, zone_id)
+                return zone_id
+
+        parent = view
+        for i, zone in enumerate(zones):
+            key = f'Zone:{view}:{".".join(zones[:i + 1])}'
+            entity_id = self.__cached_id(key, zone, parent, 'Zone')
+            if entity_id is None:
+                if retry and self.__is_stale(parent):
+                    return self.__zone_id(view, zones, retry=False)
+                zone_path = ' → '.join(zones)
+                raise Exception(f'Zone {zone_path} could not be found.')
+            parent = entity_id
+        return parent
+
+    def __get_host_or_alias(self, host, zone_id):
+        '''Get the host record or, if there is none, the alias record of a
+        name. A name cannot have both since aliases are exclusive.
+        '''
+        return self.get_entities_by_name(host, zone_id, 'HostRecord') \
+            or self.get_entities_by_name(host, zone_id, 'AliasRecord')
+
+    def __relogin(self, expired_auth_header):
+        '''Log in again unless another thread already did so.
         '''
-        properties = properties.split('|')
-        properties = [prop.split('=', 1) for prop in properties if prop]
-        return {prop[0]: prop[1] for prop in properties}
+        with self.__login_lock:
+            if self.__auth_header is expired_auth_header:
+                self.login(use_cached_token=False)
 
-    def login(self):
+    def login(self, use_cached_token=True):
         '''Logging in at Proteus.
+        If a token cache is used, a cached session is reused if possible.
         '''
-        payload = {'username': self.__user, 'password': self.__password}
-        result = requests.get(self.__url('login'),
-                              params=payload,
-                              timeout=30).json()
-        token = result.split()[2] + ' ' + result.split()[3]
+        token = None
+        if self.__token_cache and use_cached_token:
+            token = self.__token_cache.get()
+        if not token:
+            password = self.__password
+            if callable(password):
+                password = password()
+            payload = {'username': self.__user, 'password': password}
+            result = self.__get('login', payload)
+            token = result.split()[2] + ' ' + result.split()[3]
+            if self.__token_cache:
+                self.__token_cache.set(token)
         self.__auth_header = {
                 'Authorization': token,
                 'Content-Type': 'application/json'}
@@ -101,28 +337,165 @@ class Proteus:
         '''
         self.__get('logout', {})
 
-    def get_entities_by_name(self, name, parent, object_type):
-        params = {'count': 10,
-                  'name': name,
+    def __iter_pages(self, path, params, page_size=10, max_page_size=1000):
+        '''Stream all results of a paginated endpoint.
+        The page size starts small to get the first results quickly and grows
+        as long as pages come back full.
+        '''
+        start = 0
+        while True:
+            params = {**params, 'count': page_size, 'start': start}
+            page = self.__get(path, params)
+            yield from page
+            if len(page) < page_size:
+                return
+            start += page_size
+            page_size = min(page_size * 2, max_page_size)
+
+    def __with_properties(self, entities):
+        '''Turn entities into records decoding their properties on demand.
+        '''
+        return map(Record.from_entity, entities)
+
+    def iter_entities_by_name(self, name, parent, object_type):
+        params = {'name': name,
                   'parentId': parent,
-                  'start': 0,
                   'type': object_type}
-        return self.__get('getEntitiesByName', params)
+        return self.__iter_pages('getEntitiesByName', params)
+
+    def iter_entities(self, parent, object_type):
+        params = {'parentId': parent,
+                  'type': object_type}
+        return self.__iter_pages('getEntities', params, page_size=100)
+
+    def get_entities_by_name(self, name, parent, object_type):
+        return list(self.iter_entities_by_name(name, parent, object_type))
 
     def get_entities(self, parent, object_type):
-        params = {'count': 50,
-                  'parentId': parent,
-                  'start': 0,
+        return list(self.iter_entities(parent, object_type))
+
+    def get_zone_id(self, view, zone):
+        '''Get the ID of a zone like example.com in the specified view.
+        '''
+        zones, host = self.__parse_domain(zone)
+        return self.__zone_id(view, zones + [host])
+
+    def iter_records(self, zone_id, recursive=False):
+        '''Stream all host and alias records of a zone.
+        If recursive is set, records of all sub-zones are included as well.
+        '''
+        for record_type in ('HostRecord', 'AliasRecord'):
+            records = self.iter_entities(zone_id, record_type)
+            yield from self.__with_properties(records)
+        if recursive:
+            for zone in self.iter_entities(zone_id, 'Zone'):
+                yield from self.iter_records(zone['id'], recursive)
+
+    def iter_ip_addresses(self, network_id, version):
+        '''Stream all IPv4 or IPv6 addresses of a network.
+        '''
+        addresses = self.iter_entities(network_id, f'IP{version}Address')
+        return self.__with_properties(addresses)
+
+    def iter_linked_entities(self, entity_id, object_type):
+        params = {'entityId': entity_id,
                   'type': object_type}
-        return self.__get('getEntities', params)
+        entities = self.__iter_pages('getLinkedEntities', params)
+        return self.__with_properties(entities)
+
+    def iter_addresses_by_mac(self, conf_id, mac):
+        '''Stream all IPv4 and IPv6 addresses linked to a MAC address.
+        '''
+        params = {'configurationId': conf_id, 'macAddress': mac}
+        mac_id = (self.__get('getMACAddress', params) or {}).get('id')
+        if mac_id:
+            for object_type in ('IP4Address', 'IP6Address'):
+                yield from self.iter_linked_entities(mac_id, object_type)
+
+    def iter_custom_search(self, object_type, properties):
+        '''Stream all entities of a type having all the given property values.
+        '''
+        params = {'type': object_type,
+                  'filters': [f'{k}={v}' for k, v in properties.items()],
+                  'options': ''}
+        entities = self.__iter_pages('customSearch', params)
+        return self.__with_properties(entities)
+
+    def __range_cidr(self, entity):
+        '''Get the network of an IP block or network entity.
+        '''
+        properties = entity['properties']
+        if isinstance(properties, str):
+            properties = parse_properties(properties)
+        cidr = properties.get('CIDR') or properties.get('prefix')
+        return ipaddress.ip_network(cidr)
+
+    def __iter_networks_in(self, parent, network):
+        v = network.version
+        children = [(self.__range_cidr(child), child_type, child['id'])
+                    for child_type in (f'IP{v}Block', f'IP{v}Network')
+                    for child in self.iter_entities(parent, child_type)]
+        for cidr, child_type, child_id in sorted(children):
+            if not cidr.overlaps(network):
+                continue
+            if child_type.endswith('Network'):
+                yield child_id, cidr
+            else:
+                yield from self.__iter_networks_in(child_id, network)
+
+    def get_network(self, network, conf_id):
+        '''Get ID and CIDR of the IPv4 or IPv6 network containing all of the
+        given network. Returns None if there is no such network.
+        '''
+        data = self.get_container_by_ip(network.network_address, conf_id)
+        if data.get('id'):
+            cidr = self.__range_cidr(data)
+            if network.subnet_of(cidr):
+                return data['id'], cidr
+        return None
+
+    def iter_networks(self, network, conf_id):
+        '''Stream IDs and CIDRs of all IPv4 or IPv6 networks overlapping the
+        given network in ascending order.
+        '''
+        found = self.get_network(network, conf_id)
+        if found:
+            yield found
+            return
+
+        # search all networks in the smallest block containing the network
+        parent = conf_id
+        block_type = f'IP{network.version}Block'
+        data = self.get_container_by_ip(network.network_address, conf_id,
+                                        block_type)
+        if data.get('id') and network.subnet_of(self.__range_cidr(data)):
+            parent = data['id']
+        yield from self.__iter_networks_in(parent, network)
+
+    def __assigned(self, entity_id, ip, status, mac, properties):
+        '''Describe an assigned address like get_ip_address does, based on
+        what has been sent. This saves reading the address again.
+        '''
+        properties = dict(properties)
+        name = properties.pop('name', None)
+        return {'id': entity_id,
+                'name': name,
+                'type': f'IP{ip.version}Address',
+                'properties': {'address': ip.compressed,
+                               'state': status,
+                               'macAddress': mac,
+                               **properties}}
 
     def assign_ip4_address(self, conf_id, status, ip, mac, properties,
-                           hostname=None, view=None):
+                           hostname=None, view_ids=()):
+        '''Assign an IPv4 address and return it.
+        If a hostname is given, host records are created in all views.
+        '''
         status = status.upper()
         if status not in ['STATIC', 'RESERVED', 'DHCP_RESERVED']:
             raise Exception(f'Invalid status: {status}')
 
-        props = '|'.join([f'{k}={v}' for k, v in properties.items()])
+        props = format_properties(properties)
 
         params = {'action': f'MAKE_{status}',
                   'configurationId': conf_id,
@@ -130,14 +503,17 @@ class Proteus:
                   'macAddress': mac,
                   'properties': props}
 
-        if hostname and view:
-            view_ids = [x[1] for x in self.get_requested_views(view)]
+        if hostname and view_ids:
             hosts = ','.join([f'{hostname},{v},true,false' for v in view_ids])
             params['hostInfo'] = hosts
-        return self.__post('assignIP4Address', params)
+        entity_id = self.__post('assignIP4Address', params)
+        return self.__assigned(entity_id, ip, status, mac, properties)
 
     def assign_ip6_address(self, container_id, status, ip, mac, properties,
-                           hostname=None, view=None):
+                           hostname=None, view_ids=()):
+        '''Add and assign an IPv6 address to a network and return it.
+        If a hostname is given, host records are created in all views.
+        '''
         if ip.version != 6:
             raise TypeError(f'Address must be IPv6: {ip}')
 
@@ -147,10 +523,8 @@ class Proteus:
 
         # IPv4 properties contain the address name
         # IPv6 uses a separate field *arrgh!!*
-        props = '|'.join([
-            f'{k}={v}'
-            for k, v in properties.items()
-            if k != 'name'])
+        props = format_properties({k: v for k, v in properties.items()
+                                   if k != 'name'})
 
         # We need to create the IPv6 address before assigning it
         params = {'address': ip.compressed,
@@ -159,7 +533,7 @@ class Proteus:
                   'type': 'IP6Address'}
         if properties.get('name'):
             params['name'] = properties['name']
-        self.__post('addIP6Address', params)
+        entity_id = self.__post('addIP6Address', params)
 
         # Assign newly created IPv6 address
         props = f'{props}|reserveUsing=MAC_ADDRESS'
@@ -168,54 +542,167 @@ class Proteus:
                   'containerId': container_id,
                   'macAddress': mac,
                   'properties': props}
-        # Also pass along hostname information
-        if hostname and view:
-            result = []
-            for view_id in [x[1] for x in self.get_requested_views(view)]:
-                host_info = f'{view_id},{hostname},false,true'
-                params['hostInfo'] = host_info
-                result.append(self.__post('assignIP6Address', params))
-            return result
-        else:
-            return self.__post('assignIP6Address', params)
-
-    def get_container_by_ip(self, address, conf_id):
+        try:
+            # Also pass along hostname information
+            if hostname and view_ids:
+                def assign(view_id):
+                    host_info = f'{view_id},{hostname},false,true'
+                    return self.__post('assignIP6Address',
+                                       {**params, 'hostInfo': host_info})
+
+                run_all({view_id: partial(assign, view_id)
+                         for view_id in view_ids})
+            else:
+                self.__post('assignIP6Address', params)
+        except Exception:
+            # do not leave a half-created address behind
+            self.delete_entity(entity_id)
+            raise
+        return self.__assigned(entity_id, ip, status, mac, properties)
+
+    def is_assigned(self, address, status, mac, properties, hostname=None):
+        '''Check if an address returned by get_ip_address is already
+        assigned as requested, including a host record for hostname.
+        This allows to repeat assignments without changing anything.
+        '''
+        if not address.get('id'):
+            return False
+        actual = address.get('properties') or {}
+        if actual.get('state') != status.upper() \
+                or mac_key(actual.get('macAddress') or '') != mac_key(mac):
+            return False
+        # the name may also be returned as property
+        name = address.get('name') or actual.get('name')
+        if name != properties.get('name'):
+            return False
+        if any(actual.get(k) != str(v) for k, v in properties.items()
+               if k != 'name'):
+            return False
+        if hostname:
+            hosts = self.iter_linked_entities(address['id'], 'HostRecord')
+            return any(host.absolute_name == hostname.rstrip('.')
+                       for host in hosts)
+        return True
+
+    def __network_id(self, ip, conf_id, networks):
+        '''Get the ID of the network containing ip. Networks already found
+        are given as list of CIDR and ID and extended by new ones.
+        '''
+        for cidr, network_id in networks:
+            if ip in cidr:
+                return network_id
+        network = self.get_container_by_ip(ip, conf_id)
+        if not network.get('id'):
+            raise Exception(f'No network found for {ip}')
+        networks.append((self.__range_cidr(network), network['id']))
+        return network['id']
+
+    def __replace_ip6_address(self, conf_id, container_id, replace,
+                              assignment):
+        def existing():
+            address = self.get_ip_address(assignment['ip'], conf_id)
+            requested = self.is_assigned(
+                    address, assignment['status'], assignment['mac'],
+                    assignment['properties'], assignment.get('hostname'))
+            return address, requested
+
+        if replace:
+            address, requested = existing()
+            if requested:
+                return address
+            if address['id']:
+                self.delete_entity(address['id'])
+            return self.assign_ip6_address(container_id, **assignment)
+        try:
+            return self.assign_ip6_address(container_id, **assignment)
+        except ProteusError:
+            # the address may have been assigned by an interrupted run
+            address, requested = existing()
+            if requested:
+                return address
+            raise
+
+    def assign_ip6_addresses(self, conf_id, assignments, executor,
+                             replace=False):
+        '''Add and assign many IPv6 addresses using a KeyedExecutor.
+        Assignments are dicts with the arguments of assign_ip6_address
+        except the container. Each network is looked up only once. Existing
+        addresses are deleted first if replace is set. Otherwise adding them
+        fails unless they are already assigned as requested. Returns a
+        future for each assignment.
+        '''
+        networks = []
+        futures = []
+        for assignment in assignments:
+            try:
+                container_id = self.__network_id(assignment['ip'], conf_id,
+                                                 networks)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                futures.append(future)
+                continue
+            futures.append(executor.submit(
+                assignment['ip'], self.__replace_ip6_address, conf_id,
+                container_id, replace, assignment))
+        return futures
+
+    def get_container_by_ip(self, address, conf_id, object_type=None):
         params = {'address': address.compressed,
                   'containerId': conf_id,
-                  'type': f'IP{address.version}Network'}
+                  'type': object_type or f'IP{address.version}Network'}
         # https://docs.bluecatnetworks.com/r/Address-Manager-API-Guide/GET/v1/getIPRangedByIP/9.3.0
         return self.__get('getIPRangedByIP', params=params)
 
     def get_ip_address(self, ip, container_id):
+        '''Get an address. The container may be the configuration, a block
+        or the network containing the address.
+        '''
         params = {'address': ip.compressed, 'containerId': container_id}
         data = self.__get(f'getIP{ip.version}Address', params=params)
         if data.get('properties'):
-            data['properties'] = self.__parse_properties(data['properties'])
+            data['properties'] = parse_properties(data['properties'])
         return data
 
     def delete_ip_address(self, ip, container_id):
         object_id = self.get_ip_address(ip, container_id)['id']
+        return self.delete_entity(object_id)
+
+    def delete_entity(self, object_id):
         payload = {'objectId': object_id}
         return self.__delete('delete', payload)
 
+    @property
+    def views(self):
+        '''Names of the views to work in.
+        '''
+        return self.__views
+
+    def get_configuration_id(self):
+        '''Get the ID of the configuration to work in.
+        '''
+        name = self.__configuration
+        key = f'Configuration:{name}'
+        conf_id = self.__cached_id(key, name, 0, 'Configuration')
+        if conf_id is None:
+            raise Exception(f'Configuration {name} could not be found.')
+        return conf_id
+
     def get_requested_views(self, view_arg):
         '''Get requested views.
-        view_arg can be intern, extern or all.
-        It controls if this will return the view intern, extern or both.
+        view_arg is the name of a view or all for all configured views.
+        Returns a list of tuples of name and ID.
         '''
-        # get configuration_id
-        data = self.get_entities_by_name('default', 0, 'Configuration')
-        conf_id = data[0]['id']
+        conf_id = self.get_configuration_id()
 
         views = []
-
-        if view_arg in ('all', 'intern'):
-            data = self.get_entities_by_name('intern', conf_id, 'View')
-            views.append(('intern', data[0]['id']))
-
-        if view_arg in ('all', 'extern'):
-            data = self.get_entities_by_name('extern', conf_id, 'View')
-            views.append(('extern', data[0]['id']))
+        names = self.__views if view_arg == 'all' else (view_arg,)
+        for name in names:
+            key = f'View:{conf_id}:{name}'
+            view_id = self.__cached_id(key, name, conf_id, 'View')
+            if view_id is None:
+                raise Exception(f'View {name} could not be found.')
+            views.append((name, view_id))
 
         return views
 
@@ -224,26 +711,18 @@ class Proteus:
         '''
 
         zones, host = self.__parse_domain(domain)
+        parent = self.__zone_id(view, zones)
 
-        # Navigate through zones
-        parent = view
-        for zone in zones:
-            data = self.get_entities_by_name(zone, parent, 'Zone')
-            if not data:
-                zone_path = ' → '.join(zones)
-                raise Exception(f'Zone {zone_path} could not be found.')
-            parent = data[0]['id']
-
-        # Get host
-        data = self.get_entities_by_name(host, parent, 'HostRecord') \
-            + self.get_entities_by_name(host, parent, 'AliasRecord')
+        data = self.__get_host_or_alias(host, parent)
+        if not data and self.__is_stale(parent):
+            return self.get_record(view, domain)
         for record in data:
-            return self.__parse_properties(record['properties'])
+            return parse_properties(record['properties'])
         return {}
 
     def set_record(self, view, domain, targets):
 
-        record_type = self.__record_type_from_target(targets)
+        record_type = self.record_type_from_target(targets)
 
         if record_type == 'HostRecord':
             params = {'absoluteName': domain,
@@ -259,22 +738,30 @@ class Proteus:
                       'viewId': view}
             return self.__post('addAliasRecord', params)
 
+    def update_record(self, record, targets):
+        '''Change the targets of an existing host or alias record in place.
+        The targets must match the type of the record.
+        '''
+        properties = dict(record.properties or {})
+        if record.type == 'HostRecord':
+            properties['addresses'] = ','.join(targets)
+        else:
+            properties['linkedRecordName'] = targets[0]
+        entity = {'id': record.id,
+                  'name': record.name,
+                  'type': record.type,
+                  'properties': format_properties(properties)}
+        return self.__put('update', entity)
+
     def delete_record(self, view, domain):
 
         zones, host = self.__parse_domain(domain)
+        parent = self.__zone_id(view, zones)
 
-        # Navigate through zones
-        parent = view
-        for zone in zones:
-            data = self.get_entities_by_name(zone, parent, 'Zone')
-            parent = data[0]['id']
-
-        # Get host
-        data = self.get_entities_by_name(host, parent, 'HostRecord') \
-            or self.get_entities_by_name(host, parent, 'AliasRecord')
+        data = self.__get_host_or_alias(host, parent)
+        if not data and self.__is_stale(parent):
+            return self.delete_record(view, domain)
         if not data:
             return
 
-        payload = {'objectId': data[0]['id']}
-        result = self.__delete('delete', payload)
-        return result
+        return self.delete_entity(data[0]['id'])
@@ -0,0 +1,44 @@
+import csv
+import json
+
+# Fields which may contain multiple whitespace separated values
+__list_fields = ('target', 'prop')
+
+
+def _normalize(op):
+    '''Bring values from CSV or JSON into the form the commands expect.
+    '''
+    for key in __list_fields:
+        if isinstance(op.get(key), str):
+            op[key] = op[key].split()
+    if isinstance(op.get('force'), str):
+        op['force'] = op['force'].lower() in ('1', 'true', 'yes')
+    if op.get('version') is not None:
+        op['version'] = str(op['version'])
+    return op
+
+
+def read_operations(f, fmt):
+    '''Read batch operations from a CSV or JSON lines file.
+    Yields tuples of line number and operation. Instead of an operation, a
+    ValueError is yielded for lines which cannot be parsed.
+    '''
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            op = {k.strip(): v.strip() for k, v in row.items() if k and v}
+            yield reader.line_num, _normalize(op)
+        return
+
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            op = json.loads(line)
+            if not isinstance(op, dict):
+                raise ValueError('Operation must be a JSON object')
+        except ValueError as e:
+            yield line_no, ValueError(f'Invalid operation: {e}')
+            continue
+        yield line_no, _normalize(op)
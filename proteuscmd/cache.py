@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+
+
+def cache_dir():
+    '''Directory for all cached data of proteuscmd.
+    Respects XDG_CACHE_HOME and defaults to ~/.cache/proteuscmd.
+    '''
+    base = os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache'
+    return pathlib.Path(base) / 'proteuscmd'
+
+
+def write_private(path, data):
+    '''Atomically write data to a file only readable by the current user.
+    '''
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class EntityCache:
+    '''TTL-based on-disk cache mapping stable entity names like
+    configurations, views and zone paths to their entity IDs.
+    There is one cache file per server.
+    '''
+
+    def __init__(self, base_url, ttl=86400):
+        name = hashlib.sha256(base_url.encode()).hexdigest()[:16]
+        self.__path = cache_dir() / f'entities-{name}.json'
+        self.__ttl = ttl
+        self.__entries = None
+        self.__changed = False
+        self.__lock = threading.Lock()
+
+    def __load(self):
+        if self.__entries is None:
+            try:
+                with open(self.__path, 'r') as f:
+                    self.__entries = json.load(f)
+            except (OSError, ValueError):
+                self.__entries = {}
+        return self.__entries
+
+    def get(self, key):
+        '''Get cached entity ID or None if not cached or expired.
+        '''
+        with self.__lock:
+            entry = self.__load().get(key)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def set(self, key, entity_id):
+        with self.__lock:
+            self.__load()[key] = (entity_id, time.time() + self.__ttl)
+            self.__changed = True
+
+    def invalidate(self, key=None):
+        '''Drop a single key or, if no key is given, all cached entries.
+        '''
+        with self.__lock:
+            if key is None:
+                self.__entries = {}
+                self.__changed = True
+            elif self.__load().pop(key, None):
+                self.__changed = True
+
+    def save(self):
+        '''Write cache to disk if anything has changed.
+        '''
+        with self.__lock:
+            if not self.__changed:
+                return
+            now = time.time()
+            entries = {k: v for k, v in self.__entries.items() if v[1] > now}
+            write_private(self.__path, json.dumps(entries))
+            self.__changed = False
+
+
+def clear_cache():
+    '''Remove all cached entity mappings.
+    Returns the number of removed cache files.
+    '''
+    removed = 0
+    for path in cache_dir().glob('entities-*.json'):
+        path.unlink()
+        removed += 1
+    return removed
+
+
+class TokenCache:
+    '''Session tokens to be reused by consecutive invocations.
+    Tokens are stored per user and server in a file only readable by the
+    current user.
+    '''
+
+    def __init__(self, user, base_url, ttl=300):
+        key = f'{user}@{base_url}'.encode()
+        self.__key = hashlib.sha256(key).hexdigest()
+        self.__path = cache_dir() / 'tokens.json'
+        self.__ttl = ttl
+
+    def __load(self):
+        try:
+            with open(self.__path, 'r') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {k: v for k, v in tokens.items() if v['expires'] > now}
+
+    def __save(self, tokens):
+        write_private(self.__path, json.dumps(tokens))
+
+    def get(self):
+        '''Get a valid token or None if there is none.
+        '''
+        entry = self.__load().get(self.__key)
+        return entry['token'] if entry else None
+
+    def set(self, token):
+        tokens = self.__load()
+        tokens[self.__key] = {'token': token,
+                              'expires': time.time() + self.__ttl}
+        self.__save(tokens)
+
+    def invalidate(self):
+        tokens = self.__load()
+        if tokens.pop(self.__key, None):
+            self.__save(tokens)
@@ -1,22 +1,66 @@
+import contextlib
+import contextvars
 import json
 import pathlib
 import subprocess  # nosec blacklist
 import sys
 
-from proteuscmd.api import Proteus
+from proteuscmd.cache import EntityCache, TokenCache
 
 __config = None
 
+# Profile used by config() in the current context. Executors of proteuscmd
+# pass the context on to their threads.
+__profile = contextvars.ContextVar('profile', default=None)
 
-def config(key: str):
-    '''Access configuration.
-    Loading it from the configuration file if not already done.
-    '''
+
+def _load():
     global __config
     if not __config:
         with open(pathlib.Path().home() / '.proteus.json', 'r') as f:
             __config = json.load(f)
-    return __config.get(key)
+    return __config
+
+
+def config(key: str, profile=None):
+    '''Access configuration.
+    Loading it from the configuration file if not already done.
+    Settings of the active or the given profile take precedence over the
+    top-level settings.
+    '''
+    data = _load()
+    profile = profile or __profile.get()
+    settings = (data.get('profiles') or {}).get(profile) or {}
+    if key in settings:
+        return settings[key]
+    return data.get(key)
+
+
+def profiles():
+    '''Names of all profiles. The top-level settings are the profile
+    default, unless a profile of this name is configured.
+    '''
+    names = list(_load().get('profiles') or {})
+    return names if 'default' in names else ['default'] + names
+
+
+def active_profile():
+    '''Name of the active profile or None if none was selected.
+    '''
+    return __profile.get()
+
+
+@contextlib.contextmanager
+def use_profile(name):
+    '''Use the settings of a profile within this context.
+    '''
+    if name not in profiles():
+        raise ValueError(f'Unknown profile {name!r}')
+    token = __profile.set(name)
+    try:
+        yield
+    finally:
+        __profile.reset(token)
 
 
 # ANSI yellow foreground
@@ -29,7 +73,18 @@ def _eprint(msg: str):
     print(f'{_YELLOW}WARNING: {msg}{_RESET}', file=sys.stderr)
 
 
-def proteus_from_config():
+def _run_password_cmd():
+    '''Get the password by running the configured password command.
+    '''
+    password_cmd = config('password_cmd')
+    return subprocess.run(password_cmd,  # nosec B602
+                          shell=type(password_cmd) is str,
+                          capture_output=True,
+                          text=True,
+                          check=True).stdout
+
+
+def proteus_from_config(use_cache=True, hooks=None):
     '''Load configuration file and use it to initialize the proteus client.
     '''
     password = config('password')
@@ -40,11 +95,19 @@ def proteus_from_config():
             "Please use 'password_cmd' instead."
         )
     if not password:
-        password_cmd = config('password_cmd')
-        password = subprocess.run(password_cmd,  # nosec B602
-                                  shell=type(password_cmd) is str,
-                                  capture_output=True,
-                                  text=True,
-                                  check=True).stdout
+        # only run the command if we actually need to log in
+        password = _run_password_cmd
+    cache = None
+    cache_ttl = config('cache_ttl')
+    if use_cache and cache_ttl != 0:
+        cache = EntityCache(config('url'), cache_ttl or 86400)
+    token_cache = None
+    if config('token_cache'):
+        token_cache = TokenCache(config('user'), config('url'),
+                                 config('token_ttl') or 300)
+    from proteuscmd.api import Proteus
     cfg = config('user'), password, config('url'), config('replace')
-    return Proteus(*cfg)
+    return Proteus(*cfg, http=config('http'), cache=cache,
+                   token_cache=token_cache, hooks=hooks,
+                   configuration=config('configuration') or 'default',
+                   views=config('views') or ('intern', 'extern'))
@@ -0,0 +1,180 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from proteuscmd.cache import cache_dir
+
+# Commands which must never be forwarded to the daemon.
+# Bulk jobs run in a single session anyway and read from stdin by default.
+# Offline queries do not need a session at all.
+# The session of the daemon uses the top-level settings, not a profile.
+__local_commands = ('batch', 'cache', 'daemon', 'provision', '--help',
+                    '--no-cache', '--offline', '--profile')
+
+
+def socket_path():
+    return cache_dir() / 'daemon.sock'
+
+
+def _send(conn, **message):
+    conn.sendall(json.dumps(message).encode() + b'\n')
+
+
+class _SocketWriter(io.TextIOBase):
+    '''Text stream forwarding everything written to it to the client.
+    '''
+
+    def __init__(self, conn, name):
+        self.__conn = conn
+        self.__name = name
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError('Daemon output must be text')
+        if text:
+            _send(self.__conn, **{self.__name: text})
+        return len(text)
+
+
+def _needs_confirmation(args):
+    '''Deletions ask for confirmation unless forced.
+    '''
+    return 'delete' in args and '--force' not in args
+
+
+def _reads_stdin(args):
+    '''The daemon has no access to the standard input of the client.
+    Files given as - like in `dns sync -` or `ip map -f -` are read from it.
+    '''
+    return any(arg == '-' or arg.endswith('=-') or arg == '-f-'
+               for arg in args)
+
+
+def forward(args):
+    '''Run a command in a running daemon.
+    Output is passed through as it arrives. Returns the exit code or None if
+    the command cannot be forwarded and needs to run locally.
+    '''
+    if os.environ.get('PROTEUSCMD_NO_DAEMON') \
+            or os.environ.get('PROTEUSCMD_PROFILE') \
+            or any(arg.split('=', 1)[0] in __local_commands for arg in args) \
+            or _needs_confirmation(args) \
+            or _reads_stdin(args):
+        return None
+    # forward() runs on every invocation, mostly without a daemon, so the
+    # socket module is only imported if a daemon may be listening
+    path = socket_path()
+    if not path.exists():
+        return None
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(path))
+    except OSError:
+        client.close()
+        return None
+
+    with client, client.makefile('rb') as responses:
+        _send(client, args=args, cwd=os.getcwd())
+        for line in responses:
+            message = json.loads(line)
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+            elif 'exit' in message:
+                return message['exit']
+    print('Connection to daemon lost', file=sys.stderr)
+    return 1
+
+
+def _handle(conn, run):
+    import traceback
+    with conn.makefile('rb') as requests:
+        request = json.loads(requests.readline())
+    stdout = _SocketWriter(conn, 'out')
+    stderr = _SocketWriter(conn, 'err')
+    # there is no input to confirm anything
+    stdin_orig, sys.stdin = sys.stdin, io.StringIO()
+    try:
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            try:
+                # relative paths need to be relative to the client
+                os.chdir(request['cwd'])
+                exit_code = run(request['args'])
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        sys.stdin = stdin_orig
+    _send(conn, exit=exit_code)
+
+
+def _renew(proteus):
+    '''Replace the session of the daemon by a new one.
+    '''
+    from proteuscmd.api import ProteusError
+    try:
+        proteus.logout()
+    except ProteusError:
+        pass  # the old session has already expired
+    proteus.login(use_cached_token=False)
+
+
+def serve(proteus, run, refresh=600):
+    '''Serve commands on a Unix socket until interrupted.
+    Commands are run one after another using run(args) which returns the
+    exit code. The session of the Proteus client is renewed every refresh
+    seconds to keep it from expiring.
+    '''
+    import signal
+    import socket
+    path = socket_path()
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with probe:
+            if probe.connect_ex(str(path)) == 0:
+                raise RuntimeError(f'Daemon already running on {path}')
+        path.unlink()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with server:
+        umask = os.umask(0o177)
+        try:
+            server.bind(str(path))
+        finally:
+            os.umask(umask)
+        server.listen()
+        server.settimeout(refresh)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        last_login = time.monotonic()
+        print(f'Listening on {path}', file=sys.stderr)
+        try:
+            while True:
+                if time.monotonic() - last_login >= refresh:
+                    _renew(proteus)
+                    last_login = time.monotonic()
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                with conn:
+                    conn.settimeout(None)
+                    try:
+                        _handle(conn, run)
+                    except OSError:
+                        pass  # client went away
+        finally:
+            path.unlink()
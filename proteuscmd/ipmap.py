@@ -0,0 +1,91 @@
+import bisect
+import ipaddress
+import socket
+
+
+class _Index:
+    '''Sorted, non-overlapping integer intervals searchable by bisection.
+    '''
+
+    def __init__(self, intervals, name):
+        intervals = sorted(intervals)
+        for previous, current in zip(intervals, intervals[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(f'Overlapping {name} networks in v4_v6_map: '
+                                 f'{previous[3]} and {current[3]}')
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.targets = [interval[2] for interval in intervals]
+
+    def find(self, value):
+        '''Get the target of the interval containing value or None.
+        '''
+        i = bisect.bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.targets[i]
+        return None
+
+
+class IPMap:
+    '''Mapping between IPv4 networks and IPv6 prefixes.
+    The mapping is compiled once into indexes for both directions which are
+    validated for overlaps and allow lookups in logarithmic time.
+    '''
+
+    def __init__(self, mappings):
+        v4, v6 = [], []
+        for mapping in mappings:
+            ipv4_network = ipaddress.IPv4Network(mapping['cidr'])
+            ipv6_network = ipaddress.IPv6Network(mapping['prefix'])
+            v4.append((int(ipv4_network.network_address),
+                       int(ipv4_network.broadcast_address),
+                       int(ipv6_network.network_address),
+                       ipv4_network))
+            v6.append((int(ipv6_network.network_address),
+                       int(ipv6_network.broadcast_address),
+                       True,
+                       ipv6_network))
+        self.__v4 = _Index(v4, 'IPv4')
+        self.__v6 = _Index(v6, 'IPv6')
+
+    def map(self, ip):
+        '''Map an IPv4 address to IPv6 or the other way around.
+        '''
+        value = int(ip)
+        if ip.version == 4:
+            prefix = self.__v4.find(value)
+            if prefix is not None:
+                return ipaddress.IPv6Address(prefix | value)
+        elif self.__v6.find(value):
+            return ipaddress.IPv4Address(value & 0xFFFFFFFF)
+        raise ValueError(f'No mapping found for IP {ip.compressed}')
+
+    def map_text(self, text):
+        '''Map an address given as text and return the result as text.
+        This avoids creating address objects which is much faster for mapping
+        many addresses. Returns None if text is no IP address.
+        '''
+        try:
+            packed = socket.inet_pton(socket.AF_INET, text)
+        except OSError:
+            packed = None
+        if packed:
+            value = int.from_bytes(packed, 'big')
+            prefix = self.__v4.find(value)
+            if prefix is None:
+                raise ValueError(f'No mapping found for IP {text}')
+            mapped = (prefix | value).to_bytes(16, 'big')
+            mapped = socket.inet_ntop(socket.AF_INET6, mapped)
+            if '.' in mapped:
+                # embedded IPv4 notation differs from the ipaddress module
+                return ipaddress.IPv6Address(prefix | value).compressed
+            return mapped
+
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, text)
+        except OSError:
+            return None
+        value = int.from_bytes(packed, 'big')
+        if not self.__v6.find(value):
+            raise ValueError(f'No mapping found for IP {text}')
+        return socket.inet_ntop(socket.AF_INET, packed[-4:])
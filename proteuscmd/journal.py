@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from proteuscmd.cache import cache_dir
+from proteuscmd.config import active_profile
+
+
+def journal_path(job):
+    '''Path of the journal of a job in the active profile.
+    '''
+    if not re.fullmatch(r'[\w.-]+', job):
+        raise ValueError(f'Invalid job ID: {job!r}')
+    profile = active_profile()
+    if profile in (None, 'default'):
+        return cache_dir() / 'jobs' / f'{job}.jsonl'
+    return cache_dir() / 'jobs' / profile / f'{job}.jsonl'
+
+
+def new_job_id():
+    return time.strftime('%Y%m%d-%H%M%S-') + os.urandom(3).hex()
+
+
+class Journal:
+    '''Append-only record of the completed operations of a bulk job.
+
+    Each line holds the fingerprint of an operation and its result, e.g. the
+    IDs of the created objects. The fingerprint includes the line of the
+    operation, so identical operations in one file are told apart. Running
+    the job again with the same journal skips all operations completed in
+    previous runs.
+    '''
+
+    def __init__(self, job):
+        self.job = job
+        self.__path = journal_path(job)
+        # only entries of previous runs are skipped
+        self.__completed = {}
+        self.__lock = threading.Lock()
+        try:
+            with open(self.__path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line of an interrupted write
+                        continue
+                    self.__completed[entry['key']] = entry['result']
+        except FileNotFoundError:
+            pass
+        self.__path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(self.__path, os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                     0o600)
+        self.__file = os.fdopen(fd, 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def __key(op, part, line):
+        data = json.dumps([op, part, line], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+    def __len__(self):
+        return len(self.__completed)
+
+    def completed(self, op, part=None, line=None):
+        '''Check if an operation or a part of it, like one IP version, was
+        completed by a previous run of the job.
+        Returns a tuple of the state and the recorded result.
+        '''
+        key = self.__key(op, part, line)
+        return key in self.__completed, self.__completed.get(key)
+
+    def record(self, op, result, part=None, line=None):
+        '''Record an operation as completed.
+        The entry is written immediately to survive a crash.
+        '''
+        key = self.__key(op, part, line)
+        entry = {'key': key, 'line': line, 'result': result}
+        with self.__lock:
+            self.__file.write(json.dumps(entry, default=str) + '\n')
+            self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+    def remove(self):
+        '''Close and delete the journal once the job is finished.
+        '''
+        self.close()
+        self.__path.unlink(missing_ok=True)
@@ -0,0 +1,176 @@
+import io
+import json
+import sys
+
+from collections.abc import Mapping
+
+from proteuscmd.records import to_json
+
+FORMATS = ('ndjson', 'json', 'csv')
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)) and \
+            not any(isinstance(v, (Mapping, list)) for v in value):
+        return ' '.join(str(v) for v in value)
+    if isinstance(value, (Mapping, list, tuple)):
+        return json.dumps(value, separators=(',', ':'), default=to_json)
+    return value
+
+
+def _row(record):
+    '''Flatten a record for CSV. Properties become columns of their own.
+    '''
+    row = dict(record.get('properties') or {})
+    row.update((k, v) for k, v in record.items() if k != 'properties')
+    return {k: _cell(v) for k, v in row.items()}
+
+
+def _keyed(data):
+    '''Results keyed by view, IP version or profile like from `dns get`.
+    '''
+    return isinstance(data, Mapping) and 'id' not in data and \
+        bool(data) and \
+        all(isinstance(v, Mapping) or v is None for v in data.values())
+
+
+class Output:
+    '''Write the results of a command to standard output.
+
+    Records of a stream are written and flushed as soon as they arrive: as
+    JSON lines (ndjson), as elements of a single JSON array (json) or as CSV
+    rows. The result of a command returning a single document is written as
+    JSON unless another format is requested. Nothing but the CSV header is
+    kept, so the memory needed does not grow with the size of the output.
+    '''
+
+    def __init__(self, fmt=None, compact=False):
+        self.fmt = fmt
+        self.__compact = compact
+        # encoders are reused since creating them for each record is slow
+        if compact:
+            self.__line = self.__indented = json.JSONEncoder(
+                    separators=(',', ':'), default=to_json)
+        else:
+            self.__line = json.JSONEncoder(default=to_json)
+            self.__indented = json.JSONEncoder(indent=2, default=to_json)
+        self.__opened = False
+        self.__count = 0
+        self.__writer = None
+        self.__buffer = io.StringIO()
+
+    def __csv(self, columns, row=None, header=True):
+        if not self.__writer:
+            # csv is imported only if needed to keep the startup fast
+            import csv
+            self.__writer = csv.DictWriter(self.__buffer, columns,
+                                           extrasaction='ignore')
+            if header:
+                self.__writer.writeheader()
+        if row is not None:
+            self.__writer.writerow(row)
+        text = self.__buffer.getvalue()
+        self.__buffer.seek(0)
+        self.__buffer.truncate()
+        return text
+
+    def write(self, record, columns=None, header=True):
+        '''Write a single record of a stream.
+        With CSV, `columns` defaults to the fields of the first record.
+        The header can be left out, e.g. to append to an existing file.
+        '''
+        if self.fmt == 'csv':
+            row = _row(record)
+            text = self.__csv(columns or list(row), row, header)
+        elif self.fmt == 'json':
+            text = self.__indented.encode(record)
+            if not self.__compact:
+                text = '\n  ' + text.replace('\n', '\n  ')
+            text = ('[' if not self.__opened else ',' if self.__count
+                    else '') + text
+            self.__opened = True
+        else:
+            text = self.__line.encode(record) + '\n'
+        self.__count += 1
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def stream(self, records, columns=None, header=True):
+        '''Write records while they are retrieved, e.g. from a generator.
+        '''
+        # an empty stream still is a list or has a header
+        if self.fmt == 'json' and not self.__opened:
+            self.__opened = True
+            sys.stdout.write('[')
+        elif self.fmt == 'csv' and columns and not self.__writer:
+            sys.stdout.write(self.__csv(columns, header=header))
+        for record in records:
+            self.write(record, columns, header)
+
+    def result(self, data):
+        '''Write the result of a command returning a single document.
+        '''
+        if self.fmt == 'ndjson':
+            print(self.__line.encode(data))
+        elif self.fmt == 'csv':
+            if _keyed(data):
+                records = ({'key': k, **(v or {})} for k, v in data.items())
+            else:
+                records = data if isinstance(data, list) else (data,)
+            for record in records:
+                self.write(record)
+        else:
+            print(self.__indented.encode(data))
+
+    def profiles(self, documents):
+        '''Write the merged results of several profiles.
+        With CSV, each record is a row of its own with a profile column and
+        errors are rows with an error column.
+        '''
+        if self.fmt != 'csv':
+            self.result(documents)
+            return
+        rows = []
+        for profile, document in documents.items():
+            data = document.get('result')
+            if _keyed(data):
+                records = [{'key': k, **(v or {})} for k, v in data.items()]
+            elif isinstance(data, list):
+                records = data
+            else:
+                records = [] if data is None else [data]
+            for record in records:
+                if not isinstance(record, Mapping):
+                    record = {'result': record}
+                rows.append({'profile': profile, **_row(record)})
+            status = {k: v for k, v in document.items() if k != 'result'}
+            if status:
+                rows.append({'profile': profile, **status})
+        # all rows share one header, so it needs the fields of all records
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        for row in rows:
+            self.write(row, columns)
+
+    def close(self):
+        '''Terminate a JSON array once the stream is complete.
+        '''
+        if self.fmt == 'json' and self.__opened:
+            self.__opened = False
+            print(']' if self.__compact or not self.__count else '\n]')
+
+
+class Collector:
+    '''Output keeping all records instead of writing them, e.g. to merge the
+    results of several profiles.
+    '''
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record, columns=None, header=True):
+        self.records.append(record)
+
+    def stream(self, records, columns=None, header=True):
+        self.records.extend(records)
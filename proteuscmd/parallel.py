@@ -0,0 +1,132 @@
+import collections
+import contextvars
+import threading
+
+from functools import partial
+
+# concurrent.futures pulls in logging and is imported only once tasks are
+# run since many commands never need it
+
+
+class KeyedExecutor:
+    '''Run tasks in a thread pool with bounded parallelism.
+    Tasks submitted with the same key are run one after another in the order
+    they were submitted. Use e.g. the domain name or IP address as key to
+    make sure modifications of the same object never race.
+    '''
+
+    def __init__(self, jobs):
+        from concurrent.futures import ThreadPoolExecutor
+        self.__pool = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.__futures = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def submit(self, key, fn, *args, **kwargs):
+        '''Schedule fn to be run with the given arguments.
+        Returns a future representing the result.
+        '''
+        from concurrent.futures import Future
+        future = Future()
+        # run in the context of the caller, e.g. with its profile
+        fn = partial(contextvars.copy_context().run, fn)
+        with self.__lock:
+            self.__futures.add(future)
+            queue = self.__pending.get(key)
+            if queue is not None:
+                queue.append((future, fn, args, kwargs))
+                return future
+            self.__pending[key] = collections.deque()
+        self.__pool.submit(self.__run, key, future, fn, args, kwargs)
+        return future
+
+    def __run(self, key, future, fn, args, kwargs):
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # start the next task with the same key
+        with self.__lock:
+            self.__futures.discard(future)
+            queue = self.__pending[key]
+            if not queue:
+                del self.__pending[key]
+                return
+            task = queue.popleft()
+        self.__pool.submit(self.__run, key, *task)
+
+    def shutdown(self):
+        '''Wait for all submitted tasks and stop the worker threads.
+        '''
+        from concurrent.futures import wait
+        while True:
+            with self.__lock:
+                futures = list(self.__futures)
+            if not futures:
+                break
+            wait(futures)
+        self.__pool.shutdown()
+
+
+def ordered(executor, items, key, fn, window=None):
+    '''Apply fn to all items using the executor and yield the results in the
+    order of the items. Only a bounded number of items is in flight at any
+    time. The results are tuples of item and future.
+    '''
+    from concurrent.futures import wait
+    window = window or 64
+    in_flight = collections.deque()
+    try:
+        for item in items:
+            in_flight.append((item, executor.submit(key(item), fn, item)))
+            if len(in_flight) >= window:
+                item, future = in_flight.popleft()
+                wait((future,))
+                yield item, future
+        while in_flight:
+            item, future = in_flight.popleft()
+            wait((future,))
+            yield item, future
+    finally:
+        # the consumer stopped early: do not start any more tasks
+        for _, future in in_flight:
+            future.cancel()
+
+
+class ParallelError(Exception):
+    '''One or more of several independent tasks failed.
+    The individual exceptions are available as dictionary `errors`.
+    '''
+
+    def __init__(self, errors):
+        self.errors = errors
+        message = '; '.join(f'{name}: {e}' for name, e in errors.items())
+        super().__init__(message)
+
+
+def run_all(tasks):
+    '''Run independent tasks concurrently and wait for all of them.
+    Tasks are given as dictionary of names and functions. Returns a
+    dictionary of names and results. If any task fails, a ParallelError
+    containing all failures is raised once all tasks are finished.
+    '''
+    if len(tasks) < 2:
+        return {name: task() for name, task in tasks.items()}
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = {name: pool.submit(contextvars.copy_context().run, task)
+                   for name, task in tasks.items()}
+    errors = {name: future.exception() for name, future in futures.items()
+              if future.exception()}
+    if errors:
+        raise ParallelError(errors)
+    return {name: future.result() for name, future in futures.items()}
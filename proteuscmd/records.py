@@ -0,0 +1,200 @@
+import re
+
+from collections.abc import Mapping
+
+
+def parse_properties(text):
+    '''Turn the property string returned by Proteus into a dictionary.
+    Separators may be escaped in values, e.g. `comment=a\\|b`.
+    '''
+    if '\\' not in text:
+        properties = {}
+        for item in text.split('|'):
+            key, sep, value = item.partition('=')
+            if sep:
+                properties[key] = value
+        return properties
+
+    properties = {}
+    key, token, chars = None, [], iter(text)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            # keep unknown escape sequences like in C:\dir as they are
+            token.append(escaped if escaped in '|=\\' and escaped
+                         else char + escaped)
+        elif char == '=' and key is None:
+            key, token = ''.join(token), []
+        elif char == '|':
+            if key is not None:
+                properties[key] = ''.join(token)
+            key, token = None, []
+        else:
+            token.append(char)
+    if key is not None:
+        properties[key] = ''.join(token)
+    return properties
+
+
+def mac_key(mac):
+    '''Normalize a MAC address for comparison, e.g. AA:BB:... to aabb...
+    '''
+    return re.sub('[^0-9a-f]', '', mac.lower())
+
+
+def _escape(value):
+    value = str(value)
+    if '|' in value or '\\' in value:
+        value = value.replace('\\', '\\\\').replace('|', '\\|')
+    return value
+
+
+def format_properties(properties):
+    '''Turn a dictionary into a property string for Proteus.
+    '''
+    return '|'.join(f'{k}={_escape(v)}' for k, v in properties.items())
+
+
+class Record(Mapping):
+    '''Compact entity returned by Proteus.
+
+    Properties are only decoded when they are accessed. Single properties
+    are looked up in the property string without decoding all of them.
+    Like the dictionaries returned by Proteus, records can be accessed by
+    key, and additional fields can be set for the output.
+    '''
+    __slots__ = ('id', 'name', 'type', '__text', '__properties', '__extra')
+
+    def __init__(self, id, name, type, properties=None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.__text = properties if isinstance(properties, str) else None
+        self.__properties = None if self.__text is not None else properties
+        self.__extra = None
+
+    @staticmethod
+    def from_entity(entity):
+        '''Create a record of the class matching the entity type.
+        '''
+        cls = _types.get(entity.get('type'), Record)
+        return cls(entity.get('id'), entity.get('name'), entity.get('type'),
+                   entity.get('properties'))
+
+    @property
+    def properties(self):
+        '''All properties as dictionary.
+        Entities without properties have an empty one.
+        '''
+        if self.__properties is None:
+            self.__properties = parse_properties(self.__text) \
+                if self.__text else {}
+            self.__text = None
+        return self.__properties
+
+    def property(self, key, default=None):
+        '''Get a single property.
+        '''
+        text = self.__text
+        if text is None or '\\' in text:
+            return (self.properties or {}).get(key, default)
+        prefix = key + '='
+        if text.startswith(prefix):
+            start = len(prefix)
+        else:
+            start = text.find('|' + prefix)
+            if start < 0:
+                return default
+            start += len(prefix) + 1
+        end = text.find('|', start)
+        return text[start:] if end < 0 else text[start:end]
+
+    def __getitem__(self, key):
+        if key in ('id', 'name', 'type'):
+            return getattr(self, key)
+        if key == 'properties':
+            return self.properties
+        if self.__extra and key in self.__extra:
+            return self.__extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in ('id', 'name', 'type', 'properties'):
+            raise KeyError(f'{key} cannot be changed')
+        if self.__extra is None:
+            self.__extra = {}
+        self.__extra[key] = value
+
+    def __iter__(self):
+        yield from ('id', 'name', 'type', 'properties')
+        yield from self.__extra or ()
+
+    def __len__(self):
+        return 4 + len(self.__extra or ())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self):
+        '''Get the record as dictionary like returned by Proteus, including
+        additional fields.
+        '''
+        return {'id': self.id,
+                'name': self.name,
+                'type': self.type,
+                'properties': self.properties,
+                **(self.__extra or {})}
+
+
+class HostRecord(Record):
+    __slots__ = ()
+
+    @property
+    def absolute_name(self):
+        return self.property('absoluteName', self.name)
+
+    @property
+    def addresses(self):
+        return [a for a in self.property('addresses', '').split(',') if a]
+
+
+class AliasRecord(Record):
+    __slots__ = ()
+
+    @property
+    def absolute_name(self):
+        return self.property('absoluteName', self.name)
+
+    @property
+    def linked_name(self):
+        return self.property('linkedRecordName', '')
+
+
+class IPAddress(Record):
+    __slots__ = ()
+
+    @property
+    def address(self):
+        return self.property('address')
+
+    @property
+    def mac(self):
+        return self.property('macAddress')
+
+    @property
+    def state(self):
+        return self.property('state')
+
+
+_types = {'HostRecord': HostRecord,
+          'AliasRecord': AliasRecord,
+          'IP4Address': IPAddress,
+          'IP6Address': IPAddress}
+
+
+def to_json(obj):
+    '''JSON encoder default for records, e.g. json.dumps(x, default=to_json).
+    '''
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
@@ -0,0 +1,140 @@
+import collections
+import ipaddress
+import queue
+import socket
+import threading
+import time
+
+from concurrent.futures import Future, TimeoutError
+from functools import cache
+
+from proteuscmd.config import config
+
+
+class Resolver:
+    '''Resolve host names to IPv4 and IPv6 addresses.
+
+    Lookups run concurrently in up to `jobs` daemon threads, so a hanging
+    lookup does not keep the command from exiting after its timeout. Results
+    are kept in an LRU cache of `size` names for `ttl` seconds, failed
+    lookups only for `negative_ttl` seconds. Lookups of the same name in
+    progress are shared.
+    '''
+
+    def __init__(self, ttl=300, negative_ttl=10, size=4096, timeout=5,
+                 jobs=16):
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        self.__size = size
+        self.__timeout = timeout
+        self.__jobs = jobs
+        self.__workers = 0
+        self.__queue = queue.SimpleQueue()
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __lookup(name):
+        infos = socket.getaddrinfo(name, None, proto=socket.IPPROTO_TCP)
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if family in (socket.AF_INET, socket.AF_INET6):
+                # strip the scope ID of link-local addresses
+                address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+                if address not in addresses:
+                    addresses.append(address)
+        return addresses
+
+    def __work(self):
+        while True:
+            future, name = self.__queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.__lookup(name))
+            except Exception as e:
+                future.set_exception(e)
+
+    def __expired(self, entry, now):
+        created, future = entry
+        if not future.done():
+            return False
+        ttl = self.__negative_ttl if future.exception() else self.__ttl
+        return now - created > ttl
+
+    def submit(self, name):
+        '''Start resolving a name in the background if it is not cached.
+        Returns a future of the list of addresses.
+        '''
+        name = name.lower().rstrip('.')
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(name)
+            if entry and not self.__expired(entry, now):
+                self.__entries.move_to_end(name)
+                return entry[1]
+            future = Future()
+            self.__queue.put((future, name))
+            if self.__workers < self.__jobs:
+                self.__workers += 1
+                threading.Thread(target=self.__work, daemon=True,
+                                 name=f'resolver-{self.__workers}').start()
+            self.__entries[name] = (now, future)
+            self.__entries.move_to_end(name)
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+        return future
+
+    def resolve(self, value, version=None):
+        '''Get the IP address of an address literal or host name.
+        Addresses of the requested version ('4' or '6') are preferred,
+        IPv4 addresses otherwise. Raises ValueError if the name cannot be
+        resolved in time.
+        '''
+        try:
+            return ipaddress.ip_address(value)
+        except ValueError:
+            pass
+        try:
+            addresses = self.submit(value).result(self.__timeout)
+        except TimeoutError:
+            raise ValueError(f'Resolving {value!r} timed out')
+        except (socket.gaierror, UnicodeError):
+            addresses = []
+        if not addresses:
+            raise ValueError(
+                    f'{value!r} cannot be resolved to IPv4 or IPv6 address')
+        preferred = int(version) if version in ('4', '6') else 4
+        return next((a for a in addresses if a.version == preferred),
+                    addresses[0])
+
+    def prefetch(self, items, name, window=256):
+        '''Yield items while resolving the names of up to `window` items
+        ahead in the background. `name` gets the value to resolve from an
+        item and may return None. Address literals are skipped.
+        '''
+        ahead = collections.deque()
+        for item in items:
+            value = name(item)
+            if value:
+                try:
+                    ipaddress.ip_address(value)
+                except ValueError:
+                    self.submit(value)
+            ahead.append(item)
+            if len(ahead) >= window:
+                yield ahead.popleft()
+        yield from ahead
+
+
+@cache
+def resolver():
+    '''Get the resolver configured in the resolver section of the
+    configuration file.
+    '''
+    settings = config('resolver') or {}
+    return Resolver(ttl=settings.get('ttl', 300),
+                    negative_ttl=settings.get('negative_ttl', 10),
+                    size=settings.get('cache_size', 4096),
+                    timeout=settings.get('timeout', 5),
+                    jobs=settings.get('jobs', 16))
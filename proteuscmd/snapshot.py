@@ -0,0 +1,233 @@
+import ipaddress
+import json
+import re
+import sqlite3
+import time
+
+from proteuscmd.cache import cache_dir
+from proteuscmd.config import active_profile
+from proteuscmd.records import mac_key
+
+
+def snapshot_path():
+    '''Path of the snapshot of the active profile.
+    '''
+    profile = active_profile()
+    if profile in (None, 'default'):
+        return cache_dir() / 'snapshot.sqlite'
+    return cache_dir() / f'snapshot-{profile}.sqlite'
+
+
+def _json_path(key):
+    '''JSON path of a property. It is part of the SQL statement since
+    expression indexes do not work with bound parameters.
+    '''
+    if not re.fullmatch(r'[\w.-]+', key):
+        raise ValueError(f'Invalid property name {key!r}')
+    return f"'$.\"{key}\"'"
+
+
+def _targets(record):
+    if record.type == 'HostRecord':
+        return [ipaddress.ip_address(address).compressed
+                for address in record.addresses]
+    return [record.linked_name.lower().rstrip('.')]
+
+
+class Snapshot:
+    '''Local SQLite snapshot of DNS records and IP addresses for fast offline
+    queries. Each zone or range is replaced as a whole when it is pulled.
+    '''
+
+    __schema = '''
+    create table if not exists records (
+        view text not null,
+        zone text not null,
+        name text not null,
+        type text not null,
+        id integer not null,
+        properties text not null,
+        entity_name text
+    );
+    create index if not exists records_name on records (name, view);
+    create index if not exists records_zone on records (zone, view);
+
+    create table if not exists targets (
+        record integer not null,
+        target text not null
+    );
+    create index if not exists targets_target on targets (target);
+    create index if not exists targets_record on targets (record);
+
+    create table if not exists addresses (
+        range text not null,
+        address text not null,
+        id integer not null,
+        name text,
+        mac text,
+        properties text not null
+    );
+    create index if not exists addresses_address on addresses (address);
+    create index if not exists addresses_mac on addresses (mac);
+    create index if not exists addresses_range on addresses (range);
+    create index if not exists addresses_admin_email
+        on addresses (json_extract(properties, '$."admin_email"'));
+
+    create table if not exists pulls (
+        kind text not null,
+        key text not null,
+        view text not null,
+        count integer not null,
+        pulled_at real not null,
+        primary key (kind, key, view)
+    );
+    '''
+
+    def __init__(self, path=None):
+        path = path or snapshot_path()
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript(self.__schema)
+        # snapshots of older versions lack the names of the record entities
+        columns = [row[1] for row in
+                   self.__db.execute('pragma table_info(records)')]
+        if 'entity_name' not in columns:
+            with self.__db:
+                self.__db.execute(
+                        'alter table records add column entity_name text')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__db.close()
+
+    def __pulled(self, kind, key, view, count):
+        self.__db.execute('insert or replace into pulls values (?,?,?,?,?)',
+                          (kind, key, view, count, time.time()))
+
+    def replace_zone(self, view, zone, records):
+        '''Replace all records of a zone and view with the given records.
+        Returns the number of records.
+        '''
+        targets = []
+
+        def rows():
+            for record in records:
+                targets.extend((record.id, target)
+                               for target in _targets(record))
+                yield (view, zone, record.absolute_name.lower(), record.type,
+                       record.id, json.dumps(record.properties or {}),
+                       record.name)
+
+        with self.__db:
+            self.__db.execute(
+                    'delete from targets where record in ('
+                    'select id from records where zone=? and view=?)',
+                    (zone, view))
+            self.__db.execute('delete from records where zone=? and view=?',
+                              (zone, view))
+            count = self.__db.executemany(
+                    'insert into records (view, zone, name, type, id, '
+                    'properties, entity_name) values (?,?,?,?,?,?,?)',
+                    rows()).rowcount
+            self.__db.executemany('insert into targets values (?,?)',
+                                  targets)
+            self.__pulled('zone', zone, view, count)
+        return count
+
+    def replace_range(self, network, addresses):
+        '''Replace all addresses of an IP range with the given addresses.
+        Returns the number of addresses.
+        '''
+        def rows():
+            for address in addresses:
+                yield (str(network), address.address, address.id,
+                       address.name, mac_key(address.mac or '') or None,
+                       json.dumps(address.properties or {}))
+
+        with self.__db:
+            self.__db.execute('delete from addresses where range=?',
+                              (str(network),))
+            count = self.__db.executemany(
+                    'insert into addresses values (?,?,?,?,?,?)',
+                    rows()).rowcount
+            self.__pulled('range', str(network), '', count)
+        return count
+
+    def get_record(self, view, name):
+        '''Get the properties of a record like Proteus.get_record does.
+        '''
+        row = self.__db.execute(
+                'select properties from records where name=? and view=? '
+                'order by type desc limit 1',
+                (name.lower().rstrip('.'), view)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def get_ip_address(self, ip):
+        '''Get an address like Proteus.get_ip_address does.
+        '''
+        row = self.__db.execute(
+                'select id, name, properties from addresses where address=?',
+                (ip.compressed,)).fetchone()
+        if not row:
+            return {'id': 0, 'name': None, 'type': None, 'properties': None}
+        return {'id': row[0],
+                'name': row[1],
+                'type': f'IP{ip.version}Address',
+                'properties': json.loads(row[2])}
+
+    def find_records(self, target):
+        '''Find all records pointing to an IP address or, in case of aliases,
+        to a name.
+        '''
+        if isinstance(target, str):
+            target = target.lower().rstrip('.')
+        else:
+            target = target.compressed
+        rows = self.__db.execute(
+                'select view, type, id, properties, entity_name, name '
+                'from records where id in ('
+                'select record from targets where target=?) order by 4',
+                (target,))
+        for view, record_type, record_id, properties, name, absolute in rows:
+            properties = json.loads(properties)
+            if name is None:
+                # pulled by an older version, records are named by their
+                # first label unless they are at the apex of a zone
+                name = absolute.split('.', 1)[0]
+            yield {'id': record_id,
+                   'name': name,
+                   'type': record_type,
+                   'properties': properties,
+                   'view': view}
+
+    def find_addresses(self, mac=None, properties=None):
+        '''Find all addresses with a MAC address and the given property
+        values.
+        '''
+        conditions, params = [], []
+        if mac:
+            conditions.append('mac=?')
+            params.append(mac_key(mac))
+        for key, value in (properties or {}).items():
+            conditions.append(f'json_extract(properties, {_json_path(key)})=?')
+            params.append(value)
+        where = ' and '.join(conditions) or '1'
+        rows = self.__db.execute(
+                f'select id, name, properties from addresses where {where} '
+                'order by range, address', params)  # nosec B608
+        for address_id, name, properties in rows:
+            properties = json.loads(properties)
+            version = 6 if ':' in properties.get('address', '') else 4
+            yield {'id': address_id,
+                   'name': name,
+                   'type': f'IP{version}Address',
+                   'properties': properties}
+
+    def pulls(self):
+        '''Information about what has been pulled when.
+        '''
+        columns = ('kind', 'key', 'view', 'count', 'pulled_at')
+        for row in self.__db.execute('select * from pulls order by 1, 2, 3'):
+            yield dict(zip(columns, row))
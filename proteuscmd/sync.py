@@ -0,0 +1,142 @@
+import ipaddress
+import json
+
+
+def load_desired(f):
+    '''Load the desired DNS records from a JSON or YAML file like:
+
+        view: all
+        records:
+          www.example.com: [192.0.2.1, 192.0.2.2]
+          alias.example.com: www.example.com
+          old.example.com: null
+          intern.example.com:
+            targets: 192.0.2.3
+            view: intern
+
+    Yields tuples of view, domain and targets. Targets are None for records
+    which must not exist. Raises ValueError if the file is invalid.
+    '''
+    if f.name.endswith(('.yml', '.yaml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError('Reading YAML files requires PyYAML')
+        try:
+            data = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise ValueError(f'Invalid YAML: {e}')
+    else:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+
+    if not isinstance(data, dict):
+        raise ValueError('The desired state must be a mapping with records')
+    records = data.get('records') or {}
+    if not isinstance(records, dict):
+        raise ValueError('records must be a mapping of names to targets')
+    default_view = data.get('view', 'all')
+    for domain, record in records.items():
+        view = default_view
+        if isinstance(record, dict):
+            view = record.get('view', view)
+            record = record.get('targets')
+        if isinstance(record, str):
+            record = record.split()
+        if record is not None and (
+                not isinstance(record, list) or not record
+                or not all(isinstance(t, str) for t in record)):
+            raise ValueError(f'Invalid targets for {domain}: {record!r}')
+        yield view, str(domain), record
+
+
+def _normalize(record_type, targets):
+    if record_type == 'HostRecord':
+        return sorted(ipaddress.ip_address(t).compressed for t in targets)
+    return [target.lower().rstrip('.') for target in targets]
+
+
+def _current_targets(record):
+    if record.type == 'HostRecord':
+        return _normalize('HostRecord', record.addresses)
+    return _normalize('AliasRecord', [record.linked_name])
+
+
+def plan(proteus, desired, prune=False):
+    '''Compare the desired records with the current state and return the
+    necessary changes. The current state is fetched once per zone and view.
+    If prune is set, records of these zones which are not part of the
+    desired state are deleted.
+    '''
+    views = {}
+    wanted = {}
+    for view, domain, targets in desired:
+        if view not in views:
+            views[view] = proteus.get_requested_views(view)
+        name = proteus.absolute_name(domain).lower().rstrip('.')
+        if '.' not in name:
+            raise ValueError(f'{domain} is not a name within a zone')
+        zone = name.split('.', 1)[1]
+        for view_name, view_id in views[view]:
+            wanted.setdefault((view_name, view_id, zone), {})[name] = targets
+
+    changes = []
+    for (view_name, view_id, zone), records in wanted.items():
+        change = {'view': view_name, 'view_id': view_id}
+        zone_id = proteus.get_zone_id(view_id, zone)
+        current = {}
+        for record in proteus.iter_records(zone_id):
+            current[record.absolute_name.lower()] = record
+
+        for name, targets in records.items():
+            record = current.pop(name, None)
+            if targets is None:
+                if record:
+                    changes.append({**change, 'action': 'delete',
+                                    'name': name, 'id': record['id']})
+                continue
+            record_type = proteus.record_type_from_target(targets)
+            targets = _normalize(record_type, targets)
+            if not record:
+                changes.append({**change, 'action': 'create',
+                                'name': name, 'targets': targets})
+            elif record['type'] != record_type \
+                    or _current_targets(record) != targets:
+                changes.append({**change, 'action': 'update',
+                                'name': name, 'targets': targets,
+                                'id': record['id'], 'record': record})
+
+        if prune:
+            for name, record in current.items():
+                changes.append({**change, 'action': 'delete',
+                                'name': name, 'id': record['id']})
+    return changes
+
+
+def apply(proteus, change):
+    '''Apply a single change. Records keeping their type are updated in
+    place. A record changing between host and alias record is replaced and
+    restored if the new one cannot be created.
+    '''
+    action, targets = change['action'], change.get('targets')
+    if action == 'delete':
+        proteus.delete_entity(change['id'])
+        return
+    if action == 'create':
+        proteus.set_record(change['view_id'], change['name'], targets)
+        return
+
+    record = change['record']
+    if record.type == proteus.record_type_from_target(targets):
+        proteus.update_record(record, targets)
+        return
+    # a name cannot have a host and an alias record at the same time
+    proteus.delete_entity(record.id)
+    try:
+        proteus.set_record(change['view_id'], change['name'], targets)
+    except Exception:
+        proteus.set_record(change['view_id'], change['name'],
+                           _current_targets(record))
+        raise
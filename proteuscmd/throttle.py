@@ -0,0 +1,123 @@
+import email.utils
+import threading
+import time
+
+
+def retry_after(response, default):
+    '''Get the seconds to wait from the Retry-After header of a response.
+    The header may contain seconds or an HTTP date.
+    '''
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, date.timestamp() - time.time())
+
+
+class Throttle:
+    '''Protect the server from too many requests.
+
+    Requests are limited by a token bucket allowing `rate` requests per
+    second with bursts of up to `burst` requests. The number of concurrent
+    requests adapts to the server: it grows by one with every `limit`
+    successful requests and is halved if the server is overloaded or
+    responds more than `latency_factor` times slower than usual (AIMD).
+    The whole client can be paused, e.g. as requested by Retry-After.
+    '''
+
+    def __init__(self, rate=None, burst=None, max_concurrency=10,
+                 latency_factor=3):
+        self.__rate = rate
+        self.__capacity = burst or max(1, rate or 1)
+        self.__tokens = self.__capacity
+        self.__refilled = time.monotonic()
+        self.__max = max(1, max_concurrency)
+        self.__limit = float(self.__max)
+        self.__active = 0
+        self.__latency_factor = latency_factor
+        self.__baseline = None
+        self.__decreased = 0.0
+        self.__paused_until = 0.0
+        self.__condition = threading.Condition()
+
+    @property
+    def limit(self):
+        '''Current number of allowed concurrent requests.
+        '''
+        return int(self.__limit)
+
+    def __take_token(self):
+        '''Take a token and return how long to wait until it is valid.
+        '''
+        if not self.__rate:
+            return 0
+        now = time.monotonic()
+        elapsed = now - self.__refilled
+        self.__tokens = min(self.__capacity,
+                            self.__tokens + elapsed * self.__rate)
+        self.__refilled = now
+        self.__tokens -= 1
+        return max(0, -self.__tokens / self.__rate)
+
+    def acquire(self):
+        '''Wait until a request may be sent. Returns the start time to be
+        passed to release.
+        '''
+        with self.__condition:
+            while True:
+                pause = self.__paused_until - time.monotonic()
+                if pause > 0:
+                    self.__condition.wait(pause)
+                elif self.__active >= int(self.__limit):
+                    self.__condition.wait()
+                else:
+                    break
+            self.__active += 1
+            wait = self.__take_token()
+        if wait:
+            time.sleep(wait)
+        return time.monotonic()
+
+    def __congested(self, latency):
+        if self.__baseline is None:
+            self.__baseline = latency
+            return False
+        slow = latency > self.__baseline * self.__latency_factor \
+            and latency > 0.05
+        # follow faster responses quickly and slower ones only slowly
+        if latency < self.__baseline:
+            self.__baseline = latency
+        else:
+            self.__baseline += (latency - self.__baseline) * 0.01
+        return slow
+
+    def release(self, start, overloaded=False):
+        '''Mark a request as finished and adapt the concurrency limit.
+        '''
+        now = time.monotonic()
+        latency = now - start
+        with self.__condition:
+            self.__active -= 1
+            if self.__congested(latency) or overloaded:
+                # decrease only once for requests which were sent together
+                if now - self.__decreased > latency:
+                    self.__limit = max(1.0, self.__limit / 2)
+                    self.__decreased = now
+            else:
+                self.__limit = min(self.__max,
+                                   self.__limit + 1 / self.__limit)
+            self.__condition.notify_all()
+
+    def pause(self, seconds):
+        '''Do not send any requests for the given time.
+        '''
+        with self.__condition:
+            self.__paused_until = max(self.__paused_until,
+                                      time.monotonic() + seconds)
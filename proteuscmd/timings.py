@@ -0,0 +1,90 @@
+import json
+import math
+import os
+import sys
+import threading
+
+
+def _percentile(values, percent):
+    '''Nearest-rank percentile of sorted values.
+    '''
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class Timings:
+    '''Request hook collecting all calls to Proteus of a command.
+    '''
+
+    def __init__(self):
+        self.__calls = []
+        self.__lock = threading.Lock()
+
+    def __call__(self, call):
+        with self.__lock:
+            self.__calls.append(call)
+
+    def summary(self):
+        '''Calls per endpoint with count, errors, total, p50 and p95 in
+        milliseconds, ordered by total time.
+        '''
+        endpoints = {}
+        with self.__lock:
+            for call in self.__calls:
+                endpoints.setdefault(call['endpoint'], []).append(call)
+        summary = []
+        for endpoint, calls in endpoints.items():
+            durations = sorted(call['duration'] * 1000 for call in calls)
+            errors = [call for call in calls
+                      if call['status'] is None or call['status'] >= 300]
+            summary.append({'endpoint': endpoint,
+                            'calls': len(calls),
+                            'errors': len(errors),
+                            'total': sum(durations),
+                            'p50': _percentile(durations, 50),
+                            'p95': _percentile(durations, 95)})
+        return sorted(summary, key=lambda e: e['total'], reverse=True)
+
+    def print_summary(self, file=None):
+        file = file or sys.stderr
+        summary = self.summary()
+        header = ('endpoint', 'calls', 'errors', 'total ms', 'p50 ms',
+                  'p95 ms')
+        width = max([len(header[0])] + [len(e['endpoint']) for e in summary])
+        print(f'{header[0]:<{width}} ' + ' '.join(f'{h:>8}' for h in
+                                                  header[1:]), file=file)
+        for e in summary:
+            print(f'{e["endpoint"]:<{width}} {e["calls"]:>8} '
+                  f'{e["errors"]:>8} {e["total"]:>8.1f} {e["p50"]:>8.1f} '
+                  f'{e["p95"]:>8.1f}', file=file)
+        calls = sum(e['calls'] for e in summary)
+        errors = sum(e['errors'] for e in summary)
+        total = sum(e['total'] for e in summary)
+        print(f'{"all":<{width}} {calls:>8} {errors:>8} {total:>8.1f}',
+              file=file)
+
+    def write_trace(self, path):
+        '''Write all calls as spans in the style of OpenTelemetry, one JSON
+        object per line.
+        '''
+        trace_id = os.urandom(16).hex()
+        with self.__lock:
+            calls = list(self.__calls)
+        with open(path, 'w') as f:
+            for call in calls:
+                start = int(call['start'] * 1e9)
+                span = {
+                    'trace_id': trace_id,
+                    'span_id': os.urandom(8).hex(),
+                    'name': call['endpoint'],
+                    'kind': 'CLIENT',
+                    'start_time_unix_nano': start,
+                    'end_time_unix_nano': start + int(call['duration'] * 1e9),
+                    'status': 'ERROR' if call['status'] is None
+                    or call['status'] >= 300 else 'OK',
+                    'attributes': {
+                        'http.request.method': call['method'],
+                        'http.response.status_code': call['status'],
+                        'proteus.params.size': call['request_bytes'],
+                        'http.response.body.size': call['response_bytes'],
+                    }}
+                f.write(json.dumps(span) + '\n')
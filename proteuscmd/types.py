@@ -1,8 +1,9 @@
 import click
 import ipaddress
-import socket
 
-from proteuscmd.config import config
+from click.shell_completion import CompletionItem
+
+from proteuscmd.config import config, profiles
 
 
 class ConfigOption(click.Option):
@@ -20,6 +21,8 @@ class ConfigOption(click.Option):
 class IPType(click.ParamType):
     '''Click parameter type for IPv4 or IPv6 address.
     Also accepts domain names if they can be resolved to an IP address.
+    Addresses of the version given by an eager --version option are
+    preferred.
     '''
     name = 'IPv4 or IPv6 address'
 
@@ -29,18 +32,81 @@ class IPType(click.ParamType):
         except ValueError:
             pass
 
+        from proteuscmd.resolve import resolver
+        version = ctx.params.get('version') if ctx else None
         try:
-            return ipaddress.ip_address(socket.gethostbyname(value))
-        except socket.gaierror:
-            pass
+            return resolver().resolve(value, version)
+        except ValueError as e:
+            self.fail(str(e), param, ctx)
+
+
+class IPNetworkType(click.ParamType):
+    '''Click parameter type for IPv4 or IPv6 networks in CIDR notation.
+    Host bits may be set.
+    '''
+    name = 'IPv4 or IPv6 network'
+
+    def convert(self, value, param, ctx):
+        try:
+            return ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            self.fail(f'{value!r} is not a valid IPv4 or IPv6 network',
+                      param, ctx)
+
+
+class ViewType(click.ParamType):
+    '''Click parameter type for the name of a DNS view or all for all
+    configured views. Names of configured views are case insensitive.
+    '''
+    name = 'view'
 
-        self.fail(f'{value!r} cannot be resolved to IPv4 or IPv6 address',
-                  param, ctx)
+    def __views(self):
+        try:
+            return list(config('views') or ('intern', 'extern'))
+        except OSError:
+            return ['intern', 'extern']
+
+    def convert(self, value, param, ctx):
+        for name in self.__views() + ['all']:
+            if name.lower() == value.lower():
+                return name
+        return value
+
+    def shell_complete(self, ctx, param, incomplete):
+        return [CompletionItem(name)
+                for name in self.__views() + ['all']
+                if name.startswith(incomplete)]
+
+
+class ProfilesType(click.ParamType):
+    '''Click parameter type for a comma separated list of profiles.
+    '''
+    name = 'profiles'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, list):
+            return value
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in profiles()]
+        if unknown or not names:
+            self.fail(f'Unknown profile {", ".join(unknown) or value!r}. '
+                      f'Available: {", ".join(profiles())}', param, ctx)
+        return list(dict.fromkeys(names))
+
+    def shell_complete(self, ctx, param, incomplete):
+        done, _, current = incomplete.rpartition(',')
+        prefix = f'{done},' if done else ''
+        return [CompletionItem(prefix + name)
+                for name in profiles() if name.startswith(current)]
 
 
 IP_TYPE = IPType()
 
-VIEW_TYPE = click.Choice(('intern', 'extern', 'all'), case_sensitive=False)
+IP_NETWORK_TYPE = IPNetworkType()
+
+VIEW_TYPE = ViewType()
+
+PROFILES_TYPE = ProfilesType()
 
 IP_STATE_TYPE = click.Choice(('STATIC', 'DHCP_RESERVED'), case_sensitive=False)
 
@@ -23,6 +23,7 @@ setup(
     license_files=('LICENSE'),
     include_package_data=True,
     install_requires=read('requirements.txt').split(),
+    extras_require={'yaml': ['PyYAML']},
     long_description=read('README.md'),
     long_description_content_type='text/markdown',
     entry_points={